@@ -0,0 +1,390 @@
+from CommSys.Packet import Packet, PacketPool, MsgType, HeaderFormat, StreamDecoder, PacketError, calc_checksum, \
+    encode_many, CKSM_NUMPY_THRESHOLD, NUM_CKSM_BYTES, SYNC_WORD, MIN_PACKET_SIZE
+from CommSys.Compression import PayloadCompressor, SUPPORTED_CODECS
+from CommSys.CommHandler import CommHandler
+from CommSys.Link import LINK_TYPES, create_link
+import statistics
+import struct
+import threading
+import time
+import gc
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+
+# CommBenchmark.py
+#
+# Last updated: 10/18/2026
+# Offline micro-benchmarks for the Comm. System's hot paths. Unlike CommTestbench.py, no radio, satellite modem or
+# second Raspberry Pi is needed, so results can be compared directly between a development machine and the robot.
+
+arg_mode = None
+arg_capture = None
+arg_link = 'loopback'
+
+bench_repeat = 5
+
+
+# Runs func 'number' times, 'bench_repeat' times over, and returns the best average time per call in microseconds
+def time_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=bench_repeat)) / number * 1e6
+
+
+# --------------------------------------------- /// CHECKSUM BENCHMARK /// ---------------------------------------------
+checksum_sizes = [12, 64, 256, 1024, 4096, 16384, 65536 + 12]
+
+
+# Original per-word checksum loop, kept as a reference for correctness and speed comparisons
+def legacy_checksum(msg):
+    msg_padded = msg + (b'\x00' * (len(msg) % NUM_CKSM_BYTES))
+    s = 0
+    for i in range(0, len(msg), 2):
+        w = msg_padded[i] + (msg_padded[i + 1] << 8)
+        c = s + w
+        s = (c & 0xffff) + (c >> 16)
+    return int.to_bytes(~s & 0xffff, NUM_CKSM_BYTES, 'big')
+
+
+def checksum_benchmark():
+    print("-------------- Checksum Benchmark -------------")
+    print(f'NumPy path used for frames >= {CKSM_NUMPY_THRESHOLD} bytes')
+    print(f'{"Frame size (B)":>15} | {"Legacy (us/KB)":>15} | {"Current (us/KB)":>15} | {"Speedup":>8}')
+    for size in checksum_sizes:
+        msg = os.urandom(size)
+        if calc_checksum(msg) != legacy_checksum(msg):
+            print(f'ERROR: checksum mismatch for {size} byte frame!')
+            return
+
+        number = max(1, 200000 // size)
+        legacy_us = time_us(lambda: legacy_checksum(msg), max(1, number // 20))
+        current_us = time_us(lambda: calc_checksum(msg), number)
+        kb = size / 1024
+        print(f'{size:>15} | {legacy_us / kb:>15.2f} | {current_us / kb:>15.2f} | {legacy_us / current_us:>7.1f}x')
+
+
+# ----------------------------------------- /// ALLOCATION BENCHMARK /// -----------------------------------------
+alloc_num_packets = 100000
+
+
+# Packet subclass without __slots__, i.e. with a per-instance __dict__ like Packet had originally
+class DictPacket(Packet):
+    pass
+
+
+# Builds and checksums an ACK the way CommHandler.__send_ack does, either freshly allocated or from a PacketPool
+def make_ack(pid, source):
+    if isinstance(source, PacketPool):
+        ack = source.acquire(MsgType.SACK, pid=pid)
+    else:
+        ack = source(MsgType.SACK, pid=pid)
+    ack.checksum = ack.calc_checksum()
+    ack.release()
+
+
+def alloc_benchmark():
+    print("------------- Allocation Benchmark ------------")
+    dict_packet = DictPacket(MsgType.SACK)
+    print(f'Bytes per packet object: {sys.getsizeof(Packet(MsgType.SACK))} slotted, '
+          f'{sys.getsizeof(dict_packet) + sys.getsizeof(dict_packet.__dict__)} with __dict__')
+    for name, source in [("Dict Packet", DictPacket), ("Slot Packet", Packet), ("PacketPool", PacketPool())]:
+        us = time_us(lambda: make_ack(1, source), alloc_num_packets)
+
+        gc.collect()
+        tracemalloc.start()
+        for i in range(alloc_num_packets):
+            make_ack(i, source)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f'{name:>12}: %.3f us/ACK, peak traced memory {peak} B over {alloc_num_packets} ACKs' % us)
+
+
+# ----------------------------------------- /// COMPRESSION BENCHMARK /// ----------------------------------------
+compression_samples = [
+    (MsgType.INFO, b'GPS coordinates received. Starting autonomous navigation.'),
+    (MsgType.INFO, b'Stopping autonomous navigation.'),
+    (MsgType.INFO, b'Robot shutting down due to low-power'),
+    (MsgType.TEXT, b'Hello from the landbase! Please report your battery voltage.'),
+    (MsgType.ERROR, b'Error: Failed to read compass, using last known heading.'),
+    (MsgType.HEARTBEAT, b'\x02' + struct.pack('4f', 37.229994, -80.429152, 271.5, 25.4) + b'192.168.1.37'),
+]
+
+
+def compression_benchmark():
+    print("------------ Compression Benchmark ------------")
+    compressor = PayloadCompressor()
+    compressor.negotiate(bytes([SUPPORTED_CODECS]))
+    print(f'{"Type":>15} | {"Raw (B)":>8} | {"Sent (B)":>8} | {"Time (us)":>9} | Payload')
+    raw_total = sent_total = 0
+    for ptype, data in compression_samples:
+        packet = Packet(ptype, data=data)
+        us = time_us(lambda: compressor.compress(packet), 1000)
+        sent = compressor.compress(packet)
+        raw_total += packet.frame_size()
+        sent_total += sent.frame_size()
+        print(f'{str(ptype):>15} | {packet.frame_size():>8} | {sent.frame_size():>8} | {us:>9.1f} | {data[:30]}')
+    print(f'Total: {raw_total} B -> {sent_total} B per set of messages (%.1f%% saved)'
+          % (100 * (raw_total - sent_total) / raw_total))
+
+
+# -------------------------------------------- /// HEADER BENCHMARK /// ------------------------------------------
+SBD_MAX_MESSAGE_SIZE = 340
+
+
+def header_benchmark():
+    print("-------------- Header Benchmark ---------------")
+    print(f'{"Type":>18} | {"ID":>8} | {"Data (B)":>8} | {"Standard (B)":>12} | {"Compact (B)":>11} | {"Saved (B)":>9}')
+    for ptype, data in compression_samples:
+        for pid in [5, 1000, 2000000]:
+            packet = Packet(ptype, pid=pid, data=data)
+            standard = packet.frame_size()
+            compact = len(encode_many([packet], HeaderFormat.COMPACT))
+            print(f'{str(ptype):>18} | {pid:>8} | {packet.length:>8} | {standard:>12} | {compact:>11} | '
+                  f'{standard - compact:>9}')
+
+    # How many heartbeats fit in a single SBD message with each header format
+    heartbeat = Packet(MsgType.HEARTBEAT, pid=1000, data=compression_samples[-1][1])
+    for header_format in HeaderFormat:
+        per_message = SBD_MAX_MESSAGE_SIZE // len(encode_many([heartbeat], header_format))
+        print(f'{header_format.name:>8} header: {per_message} heartbeats per {SBD_MAX_MESSAGE_SIZE} B SBD message')
+
+
+# -------------------------------------------- /// STREAM BENCHMARK /// ------------------------------------------
+stream_chunk_sizes = [16, 64, 256, 4096]
+stream_num_packets = 2000
+
+
+# Original SerialPacketProtocol.data_received parser (one packet per callback, read_buf re-copied on every call), kept
+# as a reference for speed comparisons
+class LegacyDecoder:
+    def __init__(self):
+        self.read_buf = b''
+
+    def feed(self, data):
+        self.read_buf += data
+        sync_ind = self.read_buf.find(SYNC_WORD)
+        if sync_ind > 0:
+            self.read_buf = self.read_buf[sync_ind:]
+        try:
+            packet = Packet(data=self.read_buf)
+            if packet.checksum == packet.calc_checksum():
+                self.read_buf = self.read_buf[(packet.length + MIN_PACKET_SIZE):]
+                return [packet]
+            self.read_buf = self.read_buf[len(SYNC_WORD):]
+        except PacketError:
+            pass
+        except ValueError:
+            self.read_buf = self.read_buf[len(SYNC_WORD):]
+        return []
+
+
+# Builds a radio byte stream resembling live traffic: ACKs, heartbeats, text and 1 KB image fragments, with the odd
+# burst of line noise in between
+def synthetic_stream():
+    rng = random.Random(0)
+    stream = bytearray()
+    for i in range(stream_num_packets):
+        ptype, size = rng.choice([(MsgType.SACK, 0), (MsgType.HEARTBEAT, 30), (MsgType.TEXT, 60),
+                                  (MsgType.FRAGMENT, 1000), (MsgType.FRAGMENT, 1000)])
+        stream += Packet(ptype, pid=i, data=os.urandom(size), calc_checksum=True).to_binary()
+        if rng.random() < 0.02:
+            stream += os.urandom(rng.randint(1, 64))
+    return bytes(stream)
+
+
+# Feeds every chunk to decoder, returns the number of packets decoded
+def replay(decoder, chunks):
+    return sum(len(list(decoder.feed(chunk))) for chunk in chunks)
+
+
+def stream_benchmark():
+    print("--------------- Stream Benchmark --------------")
+    if arg_capture is not None:
+        with open(arg_capture, 'rb') as f:
+            stream = f.read()
+        print(f'Replaying {len(stream)} B captured from {arg_capture}')
+    else:
+        stream = synthetic_stream()
+        print(f'Replaying {len(stream)} B synthetic stream ({stream_num_packets} packets)')
+
+    print(f'{"Chunk (B)":>10} | {"Legacy (ms)":>11} | {"Decoded":>7} | {"Current (ms)":>12} | {"Decoded":>7} | '
+          f'{"Speedup":>8}')
+    for chunk_size in stream_chunk_sizes:
+        chunks = [stream[i: i + chunk_size] for i in range(0, len(stream), chunk_size)]
+        legacy_ms = time_us(lambda: replay(LegacyDecoder(), chunks), 1) / 1000
+        current_ms = time_us(lambda: replay(StreamDecoder(), chunks), 1) / 1000
+        legacy_num = replay(LegacyDecoder(), chunks)
+        current_num = replay(StreamDecoder(), chunks)
+        print(f'{chunk_size:>10} | {legacy_ms:>11.1f} | {legacy_num:>7} | {current_ms:>12.1f} | {current_num:>7} | '
+              f'{legacy_ms / current_ms:>7.1f}x')
+
+
+# ----------------------------------------- /// LOSS LATENCY BENCHMARK /// -----------------------------------------
+loss_num_packets = 50  # Of each MsgType
+loss_interval = 0.020  # Seconds between sends
+loss_delay = 0.050  # One-way link delay in seconds
+loss_every = 5  # The first transmission of every loss_every-th TEXT packet is lost
+
+
+# Returns a landbase CommHandler sending over tx_link and a robot CommHandler receiving over rx_link, connected to each
+# other through a handshake
+def connected_pair(tx_link, rx_link):
+    tx_link.connect(rx_link)
+    sender = CommHandler(landbase=True, links={tx_link.cmode: tx_link})
+    receiver = CommHandler(landbase=False, links={rx_link.cmode: rx_link})
+    # The landbase waits for the robot's handshake
+    t_handshake = threading.Thread(target=sender.start)
+    t_handshake.start()
+    receiver.start()
+    t_handshake.join()
+    return sender, receiver
+
+
+# Loses the first transmission of every loss_every-th TEXT packet
+def lossy_text(lost):
+    def drop(packet):
+        if packet.type != MsgType.TEXT:
+            return False
+        i = int(bytes(packet.data).split(b' ')[1])
+        if i % loss_every or i in lost:
+            return False
+        lost.add(i)
+        return True
+    return drop
+
+
+# Measures how long packets take to be delivered to the other party's application while TEXT packets are being lost.
+# Control requests are sent alongside the TEXT packets, and shouldn't wait for the lost ones to be retransmitted.
+def loss_benchmark():
+    print("------------ Loss Latency Benchmark -----------")
+    print(f'{loss_num_packets} TEXT + {loss_num_packets} CTRL_REQ packets over \'{arg_link}\' links, '
+          f'{loss_delay * 1000:.0f} ms one-way delay, 1st transmission of every {loss_every}th TEXT packet lost')
+    # Any registered link simulator taking delay and drop arguments and paired up by connect() can be benchmarked
+    tx_link = create_link(arg_link, delay=loss_delay, drop=lossy_text(set()))
+    rx_link = create_link(arg_link, delay=loss_delay)
+    sender, receiver = connected_pair(tx_link, rx_link)
+
+    sent = {}
+    latency = {MsgType.TEXT: [], MsgType.CTRL_REQ: []}
+
+    def send():
+        for i in range(loss_num_packets):
+            for ptype in latency:
+                data = ptype.name.encode() + b' %d' % i
+                sent[data] = time.time()
+                sender.send_packet(Packet(ptype, data=data))
+            time.sleep(loss_interval)
+
+    t_send = threading.Thread(target=send)
+    t_send.start()
+    t_end = time.time() + loss_num_packets * loss_interval + 30
+    while sum(map(len, latency.values())) < 2 * loss_num_packets and time.time() < t_end:
+        packet = receiver.recv_packet()
+        if packet is None:
+            time.sleep(0.001)
+        elif packet.type in latency:
+            latency[packet.type].append(time.time() - sent[bytes(packet.data)])
+    t_send.join()
+    sender.stop()
+    receiver.stop()
+
+    print(f'{"MsgType":>10} | {"Delivered":>9} | {"Mean (ms)":>9} | {"Max (ms)":>9}')
+    for ptype, samples in latency.items():
+        if not samples:
+            print(f'{ptype.name:>10} | {0:>9} | {"-":>9} | {"-":>9}')
+            continue
+        print(f'{ptype.name:>10} | {len(samples):>9} | {statistics.mean(samples) * 1000:>9.0f} | '
+              f'{max(samples) * 1000:>9.0f}')
+
+
+# ---------------------------------------------- /// QOS BENCHMARK /// ----------------------------------------------
+qos_num_packets = 200  # GPS_DATA packets sent while the link is stalled
+qos_interval = 0.005  # Seconds between sends
+qos_recovery = 15  # Max seconds to wait for the latest position once the link is back
+
+
+# Sends GPS_DATA positions (QosPolicy.REPLACE_PENDING) while the link is stalled, so the telemetry stream's tx window
+# fills up. Positions waiting for room in the window should keep replacing each other rather than pile up, and the
+# latest one should be delivered once the link is back.
+def qos_benchmark():
+    print("---------------- QoS Benchmark ----------------")
+    print(f'{qos_num_packets} GPS_DATA packets (REPLACE_PENDING) sent over a stalled \'{arg_link}\' link')
+    stalled = threading.Event()
+    tx_link = create_link(arg_link, delay=loss_delay, drop=lambda packet: stalled.is_set())
+    rx_link = create_link(arg_link, delay=loss_delay)
+    sender, receiver = connected_pair(tx_link, rx_link)
+
+    stalled.set()
+    futures = []
+    for i in range(qos_num_packets):
+        futures.append(sender.send_packet(Packet(MsgType.GPS_DATA, data=struct.pack('>2f', i, i))))
+        time.sleep(qos_interval)
+    in_flight = sum(len(stream.tx_window) for stream in sender.streams.values())
+    waiting = len(sender.out_queue)
+    replaced = sender.out_queue.num_dropped
+    failed = sum(1 for future in futures if future.done() and not future.delivered())
+
+    stalled.clear()
+    latest = None
+    t_end = time.time() + qos_recovery
+    while time.time() < t_end and latest != qos_num_packets - 1:
+        packet = receiver.recv_packet()
+        if packet is None:
+            time.sleep(0.01)
+        elif packet.type == MsgType.GPS_DATA:
+            latest = int(struct.unpack('>2f', packet.data)[0])
+    sender.stop()
+    receiver.stop()
+
+    print(f'In tx window: {in_flight}, waiting in scheduler: {waiting}, replaced by newer positions: {replaced} '
+          f'({failed} futures failed)')
+    print(f'Latest position delivered after the link recovered: {latest == qos_num_packets - 1}')
+
+
+# --------------------------------------------------------------------------------------------------------------------
+
+def parse_args():
+    global arg_mode, arg_capture, arg_link, bench_repeat
+    for i, arg in enumerate(sys.argv):
+        if arg == "-c" or arg == "--checksum":
+            arg_mode = "Checksum"
+        elif arg == "-a" or arg == "--alloc":
+            arg_mode = "Allocation"
+        elif arg == "-z" or arg == "--compression":
+            arg_mode = "Compression"
+        elif arg == "--header":
+            arg_mode = "Header"
+        elif arg == "-s" or arg == "--stream":
+            arg_mode = "Stream"
+        elif arg == "-l" or arg == "--loss":
+            arg_mode = "Loss"
+        elif arg == "-q" or arg == "--qos":
+            arg_mode = "QoS"
+        elif arg == "--capture":
+            arg_capture = sys.argv[i+1]
+        elif arg == "--link":
+            arg_link = sys.argv[i+1]
+            if arg_link not in LINK_TYPES:
+                sys.exit(f"Unknown link type '{arg_link}', registered types are: {', '.join(sorted(LINK_TYPES))}")
+        elif arg == "--repeat":
+            bench_repeat = int(sys.argv[i+1])
+
+
+if __name__ == "__main__":
+    parse_args()
+    if arg_mode is None or arg_mode == "Checksum":
+        checksum_benchmark()
+    if arg_mode is None or arg_mode == "Allocation":
+        alloc_benchmark()
+    if arg_mode is None or arg_mode == "Compression":
+        compression_benchmark()
+    if arg_mode is None or arg_mode == "Header":
+        header_benchmark()
+    if arg_mode is None or arg_mode == "Stream":
+        stream_benchmark()
+    if arg_mode is None or arg_mode == "Loss":
+        loss_benchmark()
+    if arg_mode is None or arg_mode == "QoS":
+        qos_benchmark()
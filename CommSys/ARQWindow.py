@@ -0,0 +1,130 @@
+from CommSys.Packet import NUM_ID_BYTES
+
+# ARQWindow.py
+#
+# Last updated: 10/18/2026
+# Send and receive windows of the selective-repeat ARQ. Each window is a fixed-size ring of slots: the packet with
+# sequence number 'seq' lives in slot (head + seq - base) % size, where head is the slot of the window's base. A bitmask
+# (bit i for slot i) records which packets have been acknowledged (send window) or received (receive window). Adding,
+# acknowledging and looking up a packet are O(1). Sliding the window past a run of acknowledged / received packets costs
+# O(1) per packet, and no lists are rebuilt.
+
+MAX_ID = pow(2, (8 * NUM_ID_BYTES))  # Sequence numbers wrap around to 0 at MAX_ID
+
+
+class ARQWindow:
+    def __init__(self, size, base=0):
+        self.size = size
+        self.reset(base)
+
+    # Empties the window and moves it to start at base
+    def reset(self, base=0):
+        self.slots = [None] * self.size
+        self.mask = 0  # Bit i is set if slot i holds an acknowledged / received packet
+        self.head = 0  # Slot of base
+        self.base = base
+
+    # Distance of seq from the window's base, in [0, MAX_ID)
+    def offset(self, seq):
+        return (seq - self.base) % MAX_ID
+
+    # Slot of seq, which must be within the window
+    def slot(self, seq):
+        return (self.head + (seq - self.base) % MAX_ID) % self.size
+
+    # Moves the window's base past one packet, clearing its slot
+    def advance(self):
+        self.slots[self.head] = None
+        self.mask &= ~(1 << self.head)
+        self.head = (self.head + 1) % self.size
+        self.base = (self.base + 1) % MAX_ID
+
+
+# Own packets that have been sent but not yet acknowledged. Sequence numbers are handed out by add().
+class TxWindow(ARQWindow):
+    def reset(self, base=0):
+        super().reset(base)
+        self.next_seq = base  # Sequence number of the next packet added
+        self.num_acked = 0  # Number of acknowledged packets not yet slid past
+
+    # Number of packets in flight, i.e. sent and not yet slid past
+    def __len__(self):
+        return (self.next_seq - self.base) % MAX_ID
+
+    # Number of packets in flight that haven't been acknowledged
+    def unacked(self):
+        return len(self) - self.num_acked
+
+    # Adds item (an unacknowledged packet) under the next sequence number and returns that number. The window must not
+    # be full.
+    def add(self, item):
+        seq = self.next_seq
+        self.slots[self.slot(seq)] = item
+        self.next_seq = (seq + 1) % MAX_ID
+        return seq
+
+    # Returns the item stored for seq, or None if seq isn't in flight or has been acknowledged
+    def get(self, seq):
+        if self.offset(seq) >= len(self):
+            return None
+        return self.slots[self.slot(seq)]
+
+    def is_acked(self, seq):
+        return self.offset(seq) < len(self) and bool(self.mask >> self.slot(seq) & 1)
+
+    # Marks seq as acknowledged and returns its item, which is dropped from the window
+    def ack(self, seq):
+        slot = self.slot(seq)
+        item = self.slots[slot]
+        self.slots[slot] = None
+        self.mask |= 1 << slot
+        self.num_acked += 1
+        return item
+
+    # Slides the window past every acknowledged packet at its base. Returns the number of packets slid past.
+    def slide(self):
+        count = 0
+        in_flight = len(self)
+        while count < in_flight and self.mask >> self.head & 1:
+            self.advance()
+            count += 1
+        self.num_acked -= count
+        return count
+
+    # Yields (seq, item) for every unacknowledged packet in the window, oldest first. If stop is given, only packets
+    # sent before stop are yielded.
+    def entries(self, stop=None):
+        end = len(self) if stop is None else min(len(self), self.offset(stop))
+        for i in range(end):
+            item = self.slots[(self.head + i) % self.size]
+            if item is not None:
+                yield (self.base + i) % MAX_ID, item
+
+
+# Packets received from the other party, buffered until every packet before them has arrived
+class RxWindow(ARQWindow):
+    # Records seq as received. packet is buffered until it can be delivered in order, pass None for packets that were
+    # already delivered.
+    def store(self, seq, packet):
+        slot = self.slot(seq)
+        self.slots[slot] = packet
+        self.mask |= 1 << slot
+
+    # Returns True if seq, which must be within the window, has been received
+    def is_received(self, seq):
+        return bool(self.mask >> self.slot(seq) & 1)
+
+    # Slides the window past every received packet at its base and returns the buffered packets among them, in order
+    def slide(self):
+        packets = []
+        while self.mask >> self.head & 1:
+            packet = self.slots[self.head]
+            if packet is not None:
+                packets.append(packet)
+            self.advance()
+        return packets
+
+    # Bitmap of the packets received after base: bit i is set if packet (base + 1 + i) has been received
+    def bitmap(self):
+        rotated = (self.mask >> self.head) | (self.mask << (self.size - self.head))
+        return (rotated & ((1 << self.size) - 1)) >> 1
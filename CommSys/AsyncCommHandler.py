@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from CommSys.CommHandler import CommHandler
+from CommSys.CommMode import CommMode
+from CommSys.Packet import Packet
+
+# AsyncCommHandler.py
+#
+# Last updated: 10/18/2026
+# asyncio front end of CommHandler, for applications that run in an event loop (e.g. alongside an asyncio web server):
+#
+#     comm = AsyncCommHandler(landbase=True)
+#     await comm.handshake()
+#     await comm.send(Packet(MsgType.TEXT, data=b'Hello'))
+#     async for packet in comm.recv():
+#         ...
+#
+# It uses the same selective-repeat ARQ as CommHandler, whose ingress and egress threads keep running underneath.
+# Received packets are handed to the event loop by a handler subscribed to every MsgType, so neither side polls. send()
+# awaits the packet's SendFuture, and handshake() waits for the connection in the loop's default executor, so the loop
+# is never blocked. Packets of MsgTypes with handlers of their own (see CommHandler.subscribe) are not passed to recv().
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCommHandler:
+    # Keyword arguments are passed on to CommHandler, unless an existing (not yet started) comm_handler is given
+    def __init__(self, comm_handler: CommHandler = None, **kwargs):
+        self.comm_handler = CommHandler(**kwargs) if comm_handler is None else comm_handler
+        self.loop = None
+        self.in_queue = None  # asyncio.Queue of received packets, created in the event loop by handshake()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    # Starts the CommHandler in the specified CommMode, or reboots it if already started. In CommMode.HANDSHAKE, returns
+    # once a connection is established and raises CommSysError if handshake_timeout seconds pass without one.
+    async def handshake(self, mode=CommMode.HANDSHAKE):
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+            self.in_queue = asyncio.Queue()
+            self.comm_handler.subscribe(None, self.__on_packet)
+        if self.comm_handler.stopped:
+            await self.loop.run_in_executor(None, self.comm_handler.start, mode)
+        else:
+            await self.loop.run_in_executor(None, self.comm_handler.reboot, mode)
+
+    # Sends packet and returns once it has been delivered (see SendFuture.py). Raises SendError if it couldn't be.
+    async def send(self, packet: Packet):
+        await self.send_nowait(packet)
+
+    # Queues packet for sending and returns an asyncio future resolved once it has been delivered
+    def send_nowait(self, packet: Packet):
+        return asyncio.wrap_future(self.comm_handler.send_packet(packet))
+
+    # Waits for and returns the next received packet
+    async def recv_packet(self):
+        return await self.in_queue.get()
+
+    # Yields received packets as they arrive, forever
+    async def recv(self):
+        while True:
+            yield await self.in_queue.get()
+
+    # Stops the CommHandler and its threads
+    async def close(self):
+        if self.loop is not None:
+            await self.loop.run_in_executor(None, self.comm_handler.stop)
+        else:
+            self.comm_handler.stop()
+
+    # Returns each link's current round-trip time and congestion window metrics, see CommHandler.link_metrics
+    def link_metrics(self):
+        return self.comm_handler.link_metrics()
+
+    # Subscribed to every MsgType, called on the ingress thread. Hands packet over to the event loop.
+    def __on_packet(self, packet: Packet):
+        try:
+            self.loop.call_soon_threadsafe(self.in_queue.put_nowait, packet)
+        except RuntimeError:
+            logger.debug(f"Dropped received packet (Type: {packet.type}), event loop is closed.")
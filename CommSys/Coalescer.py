@@ -0,0 +1,114 @@
+import logging
+import time
+from threading import Lock
+from CommSys.CommMode import CommMode
+from CommSys.Packet import Packet, MsgType, HeaderFormat, encode_many, decode_stream, MIN_PACKET_SIZE
+from CommSys.Fragmenter import LINK_MTU
+
+# Coalescer.py
+#
+# Last updated: 10/18/2026
+# Packs small packets (ACKs, heartbeats, INFO messages, motor commands, ...) bound for the same link into a single
+# BUNDLE packet, so they share one frame header, one serial write and, over satellite, one SBD session. Packets are held
+# for at most the link's hold time before being sent. Inside a bundle each packet is encoded with the compact header
+# (see Packet.py), the bundle's own checksum covering all of them:
+#
+#       ┌─────────────────────┬───────────────┬─────────────────────┬───────────────┬─────
+#       | Compact Header (1)  | -- Data (1) - | Compact Header (2)  | -- Data (2) - | ...
+#       └─────────────────────┴───────────────┴─────────────────────┴───────────────┴─────
+#
+# Each packet is unpacked by the receiver and handled as if it had arrived on its own, so RDT packets inside a bundle
+# are still acknowledged and retransmitted individually.
+
+# Seconds a small packet may wait for others to share its frame. 0 disables coalescing on that link.
+COALESCE_HOLD = {
+    CommMode.RADIO: 0.010,
+    CommMode.SATELLITE: 2.0,
+}
+
+# Packets with more data than this (in bytes) are always sent on their own
+COALESCE_MAX_DATA = 128
+
+logger = logging.getLogger(__name__)
+
+
+# Packets waiting to be bundled for a single link
+class PendingBundle:
+    __slots__ = ('packets', 'size', 'deadline')
+
+    def __init__(self):
+        self.packets = []
+        self.size = MIN_PACKET_SIZE  # Encoded size of the bundle holding 'packets'
+        self.deadline = None
+
+
+class Coalescer:
+    # hold and mtu are dicts of CommMode -> hold time / MTU of its link, COALESCE_HOLD / LINK_MTU if None
+    def __init__(self, hold=None, mtu=None):
+        self.hold = dict(COALESCE_HOLD if hold is None else hold)
+        self.mtu = dict(LINK_MTU if mtu is None else mtu)
+        self.pending = {}  # CommMode -> PendingBundle
+        self.lock = Lock()  # Packets are added from both the ingress (ACKs) and egress threads
+
+    # Returns a list of packets to write immediately in place of packet: packet itself if it isn't coalesced (preceded
+    # by the packets pending for its link, so they aren't held up behind it), a full bundle if packet didn't fit
+    # alongside the pending ones, or nothing if packet is being held. Held packets are copied, so packet may be released
+    # once this returns.
+    def add(self, packet: Packet):
+        hold = self.hold.get(packet.cmode, 0)
+        if hold <= 0 or packet.length > COALESCE_MAX_DATA or packet.type == MsgType.BUNDLE:
+            with self.lock:
+                pending = self.pending.get(packet.cmode)
+                if pending is not None and pending.packets:
+                    return [self.__bundle(packet.cmode, pending), packet]
+            return [packet]
+
+        size = packet.compact_frame_size()
+        ready = []
+        with self.lock:
+            pending = self.pending.setdefault(packet.cmode, PendingBundle())
+            if pending.packets and pending.size + size > self.mtu[packet.cmode]:
+                ready.append(self.__bundle(packet.cmode, pending))
+            if not pending.packets:
+                pending.deadline = time.time() + hold
+            pending.packets.append(packet.copy())
+            pending.size += size
+        return ready
+
+    # Returns bundles whose hold time has expired (all pending bundles if force is set), ready to be written
+    def flush(self, force=False):
+        t = time.time()
+        ready = []
+        with self.lock:
+            for cmode, pending in self.pending.items():
+                if pending.packets and (force or pending.deadline <= t):
+                    ready.append(self.__bundle(cmode, pending))
+        return ready
+
+    # Earliest time at which a pending bundle must be sent, or None if nothing is pending
+    def next_deadline(self):
+        with self.lock:
+            deadlines = [pending.deadline for pending in self.pending.values() if pending.packets]
+        return min(deadlines) if deadlines else None
+
+    def reset(self):
+        with self.lock:
+            self.pending = {}
+
+    # Empties 'pending' and returns the packet to send for it. A lone packet is sent as-is, without bundle overhead.
+    def __bundle(self, cmode, pending: PendingBundle):
+        packets = pending.packets
+        pending.packets = []
+        pending.size = MIN_PACKET_SIZE
+        if len(packets) == 1:
+            return packets[0]
+
+        bundle = Packet(MsgType.BUNDLE, data=encode_many(packets, HeaderFormat.COMPACT), cmode=cmode)
+        bundle.checksum = bundle.calc_checksum()
+        logger.debug(f"Coalesced {len(packets)} packets into a {bundle.frame_size()} B bundle.")
+        return bundle
+
+
+# Returns the packets carried by a BUNDLE packet, tagged with the bundle's CommMode
+def unbundle(bundle: Packet):
+    return list(decode_stream(bundle.data, cmode=bundle.cmode, header_format=HeaderFormat.COMPACT))
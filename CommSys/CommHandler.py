@@ -1,19 +1,31 @@
 import queue
 from CommSys.CommMode import CommMode
-from CommSys.Packet import Packet, MsgType, NUM_ID_BYTES, SYNC_WORD, MIN_PACKET_SIZE, PacketError
-from CommSys.SerialHandler import SerialHandler, RADIO_TX_TIMEOUT
-from CommSys import EmailHandler
-from CommSys.RockBlockHandler import RockBlockHandler, SAT_TX_TIMEOUT
-from threading import Thread, Lock
+from CommSys.Packet import Packet, PacketPool, MsgType, SYNC_WORD, MIN_PACKET_SIZE, PacketError, HeaderFormat, \
+    LINK_HEADER_FORMATS
+from CommSys.Link import Link, LatencyClass, register_link, create_link
+from CommSys import SerialHandler  # Registers the 'serial' link type
+from CommSys import EmailHandler  # Registers the 'email' link type
+from CommSys.RockBlockHandler import SAT_RTO, SAT_MIN_WINDOW
+from CommSys.Compression import PayloadCompressor, CompressionError
+from CommSys.Fragmenter import Fragmenter, Reassembler, inner_type, LINK_MTU, REASSEMBLY_TIMEOUT
+from CommSys.Coalescer import Coalescer, unbundle
+from CommSys.RttEstimator import RttEstimator
+from CommSys.CongestionControl import CongestionWindow
+from CommSys.ARQWindow import TxWindow, RxWindow, MAX_ID
+from CommSys.EgressScheduler import EgressScheduler, QosPolicy, TrafficClass, traffic_class
+from CommSys.SendFuture import SendFuture, SendError, fail_packets
+from threading import Thread, Lock, Event
+import heapq
+import itertools
 import logging
+import struct
 import time
-import copy
 from enum import Enum
 from queue import Queue
 
 # CommHandler.py
 #
-# Last updated: 04/26/2022 | Primary Contact: Michael Fuhrer, mfuhrer@vt.edu
+# Last updated: 10/18/2026 | Primary Contact: Michael Fuhrer, mfuhrer@vt.edu
 # Contains the primary implementation of our communication system. It uses selective-repeat ARQ and multi-threading to
 # handle sending and receiving data over multiple channels asynchronously. It also contains our handshake protocols to
 # allow the robot and landbase to coordinate which channel to use.
@@ -21,15 +33,27 @@ from queue import Queue
 # TODO List:
 # - Verify handshake behavior over satellite
 # - Reduce computation overhead & latency
-# - Add dynamic tx_timeout
-# - Add CACK behavior
 
 logger = logging.getLogger(__name__)
 
 HANDSHAKE_TIMEOUT = 3600  # 1 hr expiration time
-RX_CACK_DELAY = 0.100  # Unused
-WINDOW_SIZE = 8
-MAX_ID = pow(2, (8 * NUM_ID_BYTES))
+WINDOW_SIZE = 32  # Max packets in flight, the congestion window decides how many actually are
+DEFAULT_PEER_WINDOW = 8  # Window assumed for parties that don't advertise one in their handshake
+INITIAL_WINDOW = 8  # Congestion windows start at this, the fixed window used before congestion control
+WINDOW_STRUCT = struct.Struct('>H')  # Advertised window, follows the compression codecs in handshake payloads
+RX_CACK_DELAY = 0.100  # Max time (in seconds) an in-order packet waits before being acknowledged
+CACK_EVERY = 4  # Number of in-order packets acknowledged at once without waiting for RX_CACK_DELAY
+EGRESS_WAIT = 1.0  # Max time (in seconds) the egress thread sleeps without being woken up
+INGRESS_WAIT = 1.0  # Max time (in seconds) the ingress thread sleeps without being woken up
+FAST_RETRANSMIT_ACKS = 3  # Number of later packets acknowledged before an unacknowledged packet is resent early
+DEFAULT_STREAM = TrafficClass.TELEMETRY  # Stream of SACKs / DACKs and CACKs that don't name one
+
+# Type of link (see Link.py) created for each CommMode that CommHandler isn't given a link for. Satellite is simulated
+# until the RockBLOCK ('rockblock', robot) and email ('email', landbase) links are verified.
+DEFAULT_LINKS = {
+    CommMode.RADIO: 'serial',
+    CommMode.SATELLITE: 'dummy_sat',  # DEBUG
+}
 
 debug_string = b''
 
@@ -38,12 +62,12 @@ password = "durham365"
 
 ALLOWED_SAT_MSG_TYPES = [MsgType.HANDSHAKE, MsgType.HANDSHAKE_RESPONSE, MsgType.TEXT, MsgType.INFO, MsgType.ERROR,
                          MsgType.GPS_DATA, MsgType.GPS_CMD, MsgType.HEARTBEAT_REQ, MsgType.HEARTBEAT,
-                         MsgType.COMM_CHANGE]
+                         MsgType.COMM_CHANGE, MsgType.FRAGMENT, MsgType.BUNDLE]
 
 
 class CommHandler():
     def __init__(self, window_size=WINDOW_SIZE, ordered_delivery=True, handshake_timeout=HANDSHAKE_TIMEOUT,
-                 landbase=True):
+                 landbase=True, coalesce_hold=None, qos=None, links=None):
         super(CommHandler, self).__init__()
         # Configuration
         self.landbase = landbase
@@ -57,32 +81,70 @@ class CommHandler():
         self.handshake_timeout = handshake_timeout
 
         # Selective Repeat Flow-Control Values
-        self.tx_base = 0
-        self.tx_next_seq_num = 0
-        # Queue of sent, un-ack'd packets
-        self.tx_window = [None] * self.window_size
+        # One reliable stream per traffic class, each with its own sequence space and tx / rx windows, so a packet lost
+        # in one stream doesn't hold back delivery of the others
+        self.streams = {cls: ReliableStream(cls, self.window_size) for cls in TrafficClass}
+        # Guards the streams' tx windows
         self.tx_win_lock = Lock()
-
-        self.rx_base = 0
-        # Queue of received, buffered packets to send to application
-        self.rx_window = [None] * self.window_size
+        # Retransmission deadlines of the packets in every tx window, guarded by tx_win_lock
+        self.rtx_timer = RetransmitTimer()
+        # Links by CommMode, any Link may be given (e.g. a simulator, see Link.py). The others are created according to
+        # DEFAULT_LINKS.
+        self.links = dict(links or {})
+        for cmode, link_type in DEFAULT_LINKS.items():
+            if cmode not in self.links:
+                self.links[cmode] = create_link(link_type)
+        for cmode, link in self.links.items():
+            if link.cmode != cmode:
+                raise CommSysError(f"{type(link).__name__} carries {link.cmode}, not {cmode}!")
+        link_mtu = {cmode: link.mtu for cmode, link in self.links.items()}
+
+        # Per-link RTT estimate, sets how long to wait for an ACK before retransmitting
+        self.rtt = {cmode: RttEstimator(*link.rto) for cmode, link in self.links.items()}
+        # Per-link AIMD congestion window, sets how many packets may be in flight across all streams
+        self.cwnd = {cmode: CongestionWindow(link.min_window, min(self.window_size, DEFAULT_PEER_WINDOW), RX_CACK_DELAY,
+                                             INITIAL_WINDOW)
+                     for cmode, link in self.links.items()}
+        # Unacknowledged RDT packets sent over each link, across all streams
+        self.in_flight = dict.fromkeys(self.links, 0)
+        # Encoded bytes written to each link, priced with its cost_per_byte in link_metrics
+        self.bytes_sent = dict.fromkeys(self.links, 0)
+        self.bytes_lock = Lock()
+
+        # Preallocated packets for ACKs, handshake responses and heartbeats
+        self.ctrl_pool = PacketPool()
+
+        # Per-MsgType payload compression, codecs are negotiated during the handshake
+        self.compressor = PayloadCompressor()
+
+        # Packets larger than a link's MTU are split into fragments, which are scheduled like other egress packets
+        self.fragmenter = Fragmenter(link_mtu, {cmode: link.header_format for cmode, link in self.links.items()})
+        self.reassembler = Reassembler(timeout={cmode: link.reassembly_timeout for cmode, link in self.links.items()})
+
+        # Small packets are held for up to coalesce_hold[CommMode] seconds so they can share a single BUNDLE frame
+        self.coalescer = Coalescer(coalesce_hold, link_mtu)
 
         # Robot Interface Members
         self.in_queue = Queue()
-        self.out_queue = Queue()
-
-        # Serial/Radio Members
-        self.radio = SerialHandler()
-
-        # Satellite Members
-        # if landbase:
-        #     self.satellite = EmailHandler(username, password)
-        # else:
-        #     self.satellite = RockBlockHandler()
-        self.satellite = dummySatDevice()  # DEBUG
-
-        self.comm_dict = {CommMode.RADIO: self.radio,
-                          CommMode.SATELLITE: self.satellite}
+        # Dispatch table of MsgType (None for every other MsgType) -> tuple of (handler, executor). Packets of subscribed
+        # MsgTypes are passed to their handlers instead of in_queue. Replaced rather than modified, so the ingress
+        # thread can read it without locking.
+        self.subscribers = {}
+        self.sub_lock = Lock()
+        # Set once a handshake (response) completes the connection reboot() is waiting for
+        self.handshake_event = Event()
+        self.awaiting_handshake = False
+        # Packets waiting to be sent, control traffic goes ahead of telemetry and bulk data. Stale packets are dropped
+        # according to each MsgType's QoS policy.
+        self.out_queue = EgressScheduler(qos=qos)
+
+        # Set whenever the egress thread may have something new to do: a packet was queued, room was freed in tx_window,
+        # a packet is waiting to be coalesced, or the CommHandler is stopping
+        self.egress_event = Event()
+        # Set by the link handlers whenever they receive a packet, wakes up the ingress thread
+        self.rx_event = Event()
+        for link in self.links.values():
+            link.add_rx_listener(self.rx_event)
 
         # Threading members
         self.t_in = None
@@ -91,18 +153,82 @@ class CommHandler():
 
         self.comm_mode = None
 
-    # Append packet to egress queue. Blocking until packet is successfully added.
+    # Append packet to egress queue. Blocking until packet is successfully added. Returns a SendFuture resolved once the
+    # packet is acknowledged (or handed to the link, for packets sent without RDT), see SendFuture.py.
     def send_packet(self, packet: Packet):
         # TODO expand bad context conditions, e.g. can't send normal packets when in handshake mode
+        # The application may send or change its packet again before this send completes, so a copy carrying this
+        # send's future is sent instead. Pooled packets already belong to the CommHandler.
+        if packet.pool is None:
+            packet = packet.copy()
         if packet.cmode is None:
             packet.cmode = self.comm_mode
 
+        # E.g. sent while (re)connecting in CommMode.HANDSHAKE, before a link is chosen
+        if packet.cmode not in self.links:
+            future = SendFuture()
+            future.fail(SendError(f"No link to send the packet over in {packet.cmode}."))
+            packet.release()
+            return future
+
         if packet.cmode == CommMode.SATELLITE and packet.type not in ALLOWED_SAT_MSG_TYPES:
             raise CommSysError("Invalid packet type for satellite communication!")
             return
 
-        # Waits here until able to place item in queue
-        self.out_queue.put(packet, True, None)
+        # Compressed and split up front, so the egress scheduler shares the link out in the frames actually sent
+        compressed = self.compressor.compress(packet)
+        if compressed is not packet:
+            # The compressed copy is sent in its place, so a pooled original goes back to its pool
+            packet.release()
+            packet = compressed
+        if self.fragmenter.needs_split(packet):
+            fragments = self.fragmenter.split(packet)
+            packet.release()
+            future = SendFuture(len(fragments))
+            for fragment in fragments:
+                fragment.future = future
+            self.out_queue.put_many(fragments)
+        else:
+            future = SendFuture()
+            packet.future = future
+            self.out_queue.put(packet)
+        self.egress_event.set()
+        return future
+
+    # Sets what happens to packets of MsgType ptype that are still waiting to be sent when send_packet is given a newer
+    # one, see EgressScheduler.QosPolicy. depth is the number of packets kept by QosPolicy.DROP_OLDEST.
+    def set_qos(self, ptype: MsgType, policy: QosPolicy, depth=1):
+        self.out_queue.set_qos(ptype, policy, depth)
+
+    # Returns a packet from the control-frame pool (for heartbeats and similar small, frequent messages). Once passed to
+    # send_packet the CommHandler owns it and recycles it after transmission / acknowledgement.
+    def control_packet(self, ptype: MsgType, data: bytes = b''):
+        return self.ctrl_pool.acquire(ptype, data=data)
+
+    # Returns a dict of each link's current round-trip time estimate and retransmission timeout (in seconds), congestion
+    # window, bytes written and what they cost (in RockBLOCK credits, see Link.cost_per_byte), e.g.
+    # {CommMode.RADIO: {'srtt': 0.21, 'rttvar': 0.02, 'rto': 0.29, 'backoffs': 0, ..., 'bytes_sent': 5120, 'cost': 0}}
+    def link_metrics(self):
+        with self.bytes_lock:
+            bytes_sent = dict(self.bytes_sent)
+        return {cmode: {**estimator.metrics(), **self.cwnd[cmode].metrics(), 'bytes_sent': bytes_sent[cmode],
+                        'cost': bytes_sent[cmode] * self.links[cmode].cost_per_byte}
+                for cmode, estimator in self.rtt.items()}
+
+    # ID of the oldest own packet of the telemetry stream (TEXT, INFO, ...) that hasn't been acknowledged
+    @property
+    def tx_base(self):
+        return self.streams[DEFAULT_STREAM].tx_window.base
+
+    # ID given to the next own packet of the telemetry stream sent using RDT
+    @property
+    def tx_next_seq_num(self):
+        return self.streams[DEFAULT_STREAM].tx_window.next_seq
+
+    # ID of the next packet of the telemetry stream expected from the other party
+    @property
+    def rx_base(self):
+        return self.streams[DEFAULT_STREAM].rx_window.base
 
     # Pops and returns the oldest packet in the ingress queue, returns none if no available item in queue
     def recv_packet(self):
@@ -115,6 +241,27 @@ class CommHandler():
     def recv_flag(self):
         return not self.in_queue.empty()
 
+    # Calls handler(packet) for every packet of MsgType ptype received from now on, instead of placing them in the
+    # ingress queue. If ptype is None, handler receives the packets of every MsgType without handlers of its own.
+    # Handlers are called on the ingress thread, so must be quick and must not call reboot(), unless an executor
+    # (e.g. a concurrent.futures.ThreadPoolExecutor) is given to run them on. Use a single-worker executor to keep
+    # handlers running in the order packets were received.
+    def subscribe(self, ptype, handler, executor=None):
+        with self.sub_lock:
+            self.subscribers = {**self.subscribers, ptype: self.subscribers.get(ptype, ()) + ((handler, executor),)}
+
+    # Removes handler from the handlers of MsgType ptype. Once a MsgType has no handlers left, its packets are placed
+    # in the ingress queue again (or passed to the handlers of None).
+    def unsubscribe(self, ptype, handler):
+        with self.sub_lock:
+            handlers = tuple(sub for sub in self.subscribers.get(ptype, ()) if sub[0] != handler)
+            subscribers = dict(self.subscribers)
+            if handlers:
+                subscribers[ptype] = handlers
+            else:
+                subscribers.pop(ptype, None)
+            self.subscribers = subscribers
+
     # Starts the CommHandler and its threads in the specified CommMode.
     def start(self, mode=CommMode.HANDSHAKE):
         if not self.stopped:
@@ -123,38 +270,47 @@ class CommHandler():
         self.t_in = Thread(target=self.__update_ingress)
         self.t_out = Thread(target=self.__update_egress)
 
-        self.radio.start()
-        self.satellite.start()
+        for link in self.links.values():
+            link.start()
 
+        # Reset before the threads run, so a handshake received straight away isn't undone or missed
+        self.__reset(mode)
         self.run()
-        self.reboot(mode)
+        self.__connect(mode)
 
     # Clears tx/rx windows & egress/ingress queues. Changes CommMode to that specified. Raises exception if passed
     # CommMode.HANDSHAKE and handshake_timout seconds pass without a connection.
     def reboot(self, mode):
+        self.__reset(mode)
+        self.__connect(mode)
+
+    # Clears tx/rx windows & egress/ingress queues and changes CommMode to that specified
+    def __reset(self, mode):
         self.comm_mode = mode
-        self.tx_base = 0
-        self.rx_base = 0
+        self.handshake_event.clear()
+        self.awaiting_handshake = mode == CommMode.HANDSHAKE
         self.__reset_windows()
         self.in_queue = Queue()
-        self.out_queue = Queue()
+        self.__clear_egress_queues(f"CommHandler rebooted in {mode} before the packet was sent.")
+        self.reassembler.reset()
+        self.coalescer.reset()
+
+    # In CommMode.HANDSHAKE, sends own handshakes (robot only) and waits for the connection to be established. Raises
+    # exception if handshake_timout seconds pass without a connection.
+    def __connect(self, mode):
         if mode == CommMode.HANDSHAKE:
             if not self.landbase:
-                handshake_p1 = Packet(ptype=MsgType.HANDSHAKE, cmode=CommMode.RADIO)
-                handshake_p2 = Packet(ptype=MsgType.HANDSHAKE, cmode=CommMode.SATELLITE)
+                handshake_p1 = Packet(ptype=MsgType.HANDSHAKE, data=self.__handshake_data(), cmode=CommMode.RADIO)
+                handshake_p2 = Packet(ptype=MsgType.HANDSHAKE, data=self.__handshake_data(), cmode=CommMode.SATELLITE)
                 self.send_packet(handshake_p1)
                 self.send_packet(handshake_p2)
-            # If in handshake mode, try to establish connection within timeout period
-            handshake_expire = time.time() + HANDSHAKE_TIMEOUT
-            # Incoming handshake will be forwarded to in_queue
-            while self.in_queue.empty() and time.time() < handshake_expire:
-                pass
-
-            if self.in_queue.empty():
+            # If in handshake mode, try to establish connection within timeout period. The incoming handshake that
+            # establishes it is not delivered to the application.
+            connected = self.handshake_event.wait(self.handshake_timeout)
+            self.awaiting_handshake = False
+            if not connected:
                 raise CommSysError(f'Failed to establish connection!')
-            else:
-                logger.info("Successfully performed handshake.")
-                self.recv_packet()  # clear handshake packet from queue
+            logger.info("Successfully performed handshake.")
 
     # Overrides Thread parent function.
     def run(self):
@@ -167,89 +323,146 @@ class CommHandler():
     def stop(self):
         if not self.stopped:
             self.stopped = True
+            self.egress_event.set()
+            self.rx_event.set()
             self.t_in.join()
             self.t_out.join()
-            self.radio.close()
-            self.satellite.close()
+            for link in self.links.values():
+                link.close()
 
         logger.info("CommHandler closed.")
 
-    # Thread target which continuously 1) pops packets from egress queue and adds them to the tx_window whenever there
-    # is room, and 2) resends any expired packets in tx_window
+    # Thread target which 1) pops packets from egress queue and adds them to the tx_window whenever there is room,
+    # 2) resends any expired packets in tx_window and 3) sends coalesced packets once their hold time is up. Sleeps
+    # until woken by egress_event or until the next retransmission / coalescing deadline.
     def __update_egress(self):
         logger.debug("Update egress thread started.")
         while not self.stopped:
+            # Cleared before looking for work, so wakeups that happen while sending aren't lost
+            self.egress_event.clear()
             self.__resend_expired_packets()
+            for packet in self.coalescer.flush():
+                self.__write_link(packet)
 
-            try:
-                send_packet = self.out_queue.get(False)
-            except queue.Empty:
+            # RDT packets are only taken out of the scheduler once their stream has room in its tx window
+            send_packet = self.out_queue.get(self.__can_send)
+            if send_packet is None:
+                self.egress_event.wait(self.__egress_wait_time())
                 continue
 
             logger.debug(f"send_packet: {send_packet.type} {send_packet.cmode}")
-            if self.comm_dict[send_packet.cmode].reliable or \
-                    (send_packet.type == MsgType.IMAGE and not self.reliable_img) or \
-                    (send_packet.type == MsgType.MTR_CMD and not self.reliable_mtr_cmd):
-                self.__tx_simple(send_packet)
-            else:
-                if (self.tx_next_seq_num - self.tx_base) % MAX_ID < self.window_size:
-                    # Slot available in tx_window, add packet
-                    try:
-                        self.__tx_rdt(send_packet)
-                    except FlowControlError as e:
-                        logger.warning(str(e))
+            try:
+                if not self.__uses_rdt(send_packet):
+                    self.__tx_simple(send_packet)
                 else:
-                    # No available space in tx_window - re-add packet to out_queue w/ warning
-                    try:
-                        self.out_queue.put_nowait(send_packet)
-                        logger.warning("No room in tx window. Moved packet to back of queue.")
-                    except queue.Full:
-                        logger.warning("No room in tx window. Dropped packet because queue was full!")
+                    self.__tx_rdt(self.streams[traffic_class(send_packet)], send_packet)
+            except FlowControlError as e:
+                logger.warning(str(e))
+                fail_packets([send_packet], str(e))
+            except Exception as e:
+                # A packet that can't be sent mustn't stop the egress thread
+                logger.exception(f"Failed to send packet (Type: {send_packet.type}, CommMode: {send_packet.cmode})")
+                fail_packets([send_packet], f"Failed to send the packet: {e!r}")
 
         logger.debug("Update egress thread exiting.")
-        # Cleanup transmission window upon exiting
-        self.__shift_tx_window(self.window_size)
-
-    # Thread target which continuously reads relevant interfaces and appends any found packets to ingress queue.
+        for packet in self.coalescer.flush(force=True):
+            self.__write_link(packet)
+        # Cleanup transmission window and queues upon exiting
+        self.__clear_tx_window()
+        self.__clear_egress_queues("CommHandler stopped before the packet was sent.")
+
+    # Returns True if packet can be sent now: it is sent without RDT, or its stream has room in its tx window. Packets
+    # without a link are taken out too, so the egress thread can fail them.
+    def __can_send(self, packet: Packet):
+        if packet.cmode not in self.links:
+            return True
+        return not self.__uses_rdt(packet) or self.__tx_window_has_room(self.streams[traffic_class(packet)],
+                                                                         packet.cmode)
+
+    # Returns True if another packet of stream can be sent over cmode. A stream's window never exceeds the other
+    # party's advertised window. Unacknowledged packets of all streams sent over cmode share its congestion window,
+    # except for control packets: they are few, small and latency-critical, so they are only limited by their stream's
+    # window and never wait behind lost telemetry or bulk packets.
+    def __tx_window_has_room(self, stream, cmode):
+        cwnd = self.cwnd[cmode]
+        if len(stream.tx_window) >= cwnd.max_window:
+            return False
+        if stream.cls == TrafficClass.CONTROL:
+            return True
+        return self.in_flight[cmode] < cwnd.window()
+
+    # Seconds until the egress thread next has to retransmit or send coalesced packets, at most EGRESS_WAIT
+    def __egress_wait_time(self):
+        t = time.time()
+        deadline = t + EGRESS_WAIT
+        with self.tx_win_lock:
+            rtx_deadline = self.rtx_timer.next_deadline()
+        if rtx_deadline is not None:
+            deadline = min(deadline, rtx_deadline)
+        coalesce_deadline = self.coalescer.next_deadline()
+        if coalesce_deadline is not None:
+            deadline = min(deadline, coalesce_deadline)
+        return max(0.0, deadline - t)
+
+    # Returns True if packet is sent / received using RDT, based on its link and the MsgType it carries
+    def __uses_rdt(self, packet: Packet):
+        ptype = inner_type(packet)
+        return not (self.links[packet.cmode].reliable or
+                    (ptype == MsgType.IMAGE and not self.reliable_img) or
+                    (ptype == MsgType.MTR_CMD and not self.reliable_mtr_cmd))
+
+    # Thread target which reads relevant interfaces and appends any found packets to ingress queue. Sleeps until a link
+    # has received something.
     def __update_ingress(self):
         logger.debug("Update ingress thread started.")
         while not self.stopped:
+            wait = INGRESS_WAIT
+            for stream in self.streams.values():
+                if stream.cack_deadline is not None:
+                    wait = min(wait, stream.cack_deadline - time.time())
+            self.rx_event.wait(max(0.0, wait))
+            # Cleared before reading, so packets that arrive while reading wake the next iteration
+            self.rx_event.clear()
             try:
                 self.__read()
             except FlowControlError as e:
                 logger.warning(str(e))
+            t = time.time()
+            for stream in self.streams.values():
+                if stream.cack_deadline is not None and t >= stream.cack_deadline:
+                    self.__send_cack(stream)
         logger.debug("Update ingress thread exiting.")
 
     # Send packet to link-layer classes w/o RDT handling
     def __tx_simple(self, packet: Packet):
         packet.checksum = packet.calc_checksum()
         logger.debug(f"Simple transmission of packet (Type: {packet.type})")
+        future = packet.future
         self.__write(packet)
+        packet.release()
+        if future is not None:
+            future.packet_done()
 
-    # Add packet to tx_window and increment sequence number
-    def __tx_rdt(self, packet: Packet):
-        packet.id = self.tx_next_seq_num  # Set packet ID
+    # Add packet to the stream's tx window and increment its sequence number
+    def __tx_rdt(self, stream, packet: Packet):
+        packet.id = stream.tx_window.next_seq  # Set packet ID
         # Recalculate packet's checksum w/ new ID
         packet.checksum = packet.calc_checksum()
 
         with self.tx_win_lock:
-            window_index = (packet.id - self.tx_base) % MAX_ID
-
             # Check to ensure that there is room in the window
-            if window_index < 0 or window_index >= self.window_size:
+            if len(stream.tx_window) >= self.window_size:
                 raise FlowControlError(f'Cannot add packet to full transmission window! '
                                        f'Attempted addition: {packet.type} (ID: {packet.id})')
 
-            if self.tx_window[window_index] is not None:
-                raise FlowControlError(f'Attempting to overwrite an item already in transmission window! '
-                                       f'Attempted addition to index {window_index}: {packet.type} (ID: {packet.id})')
-            self.tx_window[window_index] = {"packet": copy.deepcopy(packet),
-                                            "timestamp": time.time()}
+            entry = TxWindowEntry(packet, time.time(), packet.future)
+            stream.tx_window.add(entry)
+            self.in_flight[packet.cmode] += 1
+            self.rtx_timer.schedule(entry, entry.timestamp + self.rtt[packet.cmode].rto)
 
         logger.debug(
             f"Transmitting packet (ID: {packet.id}, MsgType: {packet.type}, Checksum {packet.checksum})")
         self.__write(packet)
-        self.tx_next_seq_num = (self.tx_next_seq_num + 1) % MAX_ID
 
     # Deliver packet directly to ingress queue if packet is valid.
     def __rx_simple(self, packet: Packet):
@@ -259,9 +472,49 @@ class CommHandler():
                 f"Dropped packet (Type: {packet.type}) due to invalid checksum.")
             return  # Drop packet
 
-        self.in_queue.put(packet)
+        self.__deliver(packet)
+
+    # Reassembles fragments, decompresses packet if needed and places it in the ingress queue for the application
+    def __deliver(self, packet: Packet):
+        if packet.type == MsgType.FRAGMENT:
+            packet = self.reassembler.add(packet)
+            if packet is None:
+                return
+        try:
+            packet = self.compressor.decompress(packet)
+        except CompressionError as e:
+            logger.warning(str(e))
+            return
+        self.__dispatch(packet)
+
+    # Passes packet to the handlers subscribed to its MsgType, or places it in the ingress queue if there are none
+    def __dispatch(self, packet: Packet):
+        handlers = self.subscribers.get(packet.type) or self.subscribers.get(None)
+        if handlers is None:
+            self.in_queue.put(packet)
+            return
+        for handler, executor in handlers:
+            if executor is None:
+                self.__call_handler(handler, packet)
+            else:
+                executor.submit(self.__call_handler, handler, packet)
+
+    # Runs a subscribed handler, logging rather than raising its exceptions so they don't stop the ingress thread
+    def __call_handler(self, handler, packet: Packet):
+        try:
+            handler(packet)
+        except Exception:
+            logger.exception(f"Handler of {packet.type} packets raised an exception.")
+
+    # Completes the connection reboot() is waiting for, otherwise delivers the handshake (response) to the application
+    def __connected(self, packet: Packet):
+        if self.awaiting_handshake:
+            self.awaiting_handshake = False
+            self.handshake_event.set()
+        else:
+            self.__dispatch(packet)
 
-    # Add packet to rx_window, handle ack'ing behavior
+    # Add packet to its stream's rx window, handle ack'ing behavior
     def __rx_rdt(self, packet: Packet):
         # Ensure checksum matches expectation
         if packet.checksum != packet.calc_checksum():
@@ -277,229 +530,464 @@ class CommHandler():
             return
 
         # Application Packets handled below, e.g. TEXT, IMAGE, etc.
-        if packet.id == self.rx_base:
+        stream = self.streams[traffic_class(packet)]
+        rx_window = stream.rx_window
+        offset = rx_window.offset(packet.id)
+        if offset == 0:
             # Packet is in-order, deliver directly to application alongside any packets waiting in buffer
             logger.debug(
                 f"Received packet (ID: {packet.id} Type: {packet.type})")
-            self.rx_window[0] = packet
-            self.__deliver_rx_window()
-            # Cumulative ACK handler
-            self.__send_ack(packet)  # TODO: replace with CACK handler
+            rx_window.store(packet.id, packet)
+            self.__deliver_rx_window(stream)
+            self.__schedule_cack(stream, packet)
 
-        elif 0 < (packet.id - self.rx_base) % MAX_ID < self.window_size:
+        elif offset < self.window_size:
             # Packet is out-of-order
-            window_index = (packet.id - self.rx_base) % MAX_ID
-            if not self.ordered_delivery:
-                # Deliver directly to application, add placeholder to buffer
-                logger.debug(f"Received out-of-order packet (ID: {packet.id}, Expected ID: {self.rx_base}). "
+            if rx_window.is_received(packet.id):
+                logger.debug(f"Received duplicate of out-of-order packet (ID: {packet.id}).")
+            elif not self.ordered_delivery:
+                # Deliver directly to application, only mark it as received in the buffer
+                logger.debug(f"Received out-of-order packet (ID: {packet.id}, Expected ID: {rx_window.base}). "
                              f"Delivering directly to application regardless.")
-                self.in_queue.put(packet)
-                self.rx_window[window_index] = "DEL"  # Delivered tag
+                self.__deliver(packet)
+                rx_window.store(packet.id, None)
             else:
                 # Buffer the packet
-                logger.debug(f"Received out-of-order packet (ID: {packet.id}, Expected ID: {self.rx_base}). "
+                logger.debug(f"Received out-of-order packet (ID: {packet.id}, Expected ID: {rx_window.base}). "
                              f"Buffering.")
-                self.rx_window[window_index] = packet
-            # Send selective ACK
-            self.__send_ack(packet)
+                rx_window.store(packet.id, packet)
+            # Acknowledge right away, so the sender learns of the gap below this packet
+            stream.cack_cmode = packet.cmode
+            self.__send_cack(stream)
 
         else:
             # Received packet outside of reception window, send duplicate ack if within past 20 packets
-            if (packet.id - self.rx_base) % MAX_ID > -WINDOW_SIZE:
+            if offset > -WINDOW_SIZE:
                 logger.debug(f"Packet received (ID: {packet.id}) outside expected window,"
                              f" but within it's reason.")
-                self.__send_ack(packet, MsgType.DACK)
+                # Sender missed an earlier ACK, send a new one right away
+                stream.cack_cmode = packet.cmode
+                self.__send_cack(stream)
             else:
                 logger.debug(f"Packet received (ID: {packet.id}) outside expected window,"
                              f" but seems outside reason - dropping")
                 return
 
-    # Used to interpret incoming ACK packets and acknowledge packets in own tx_window
+    # Used to interpret incoming ACK packets and acknowledge packets in own tx windows
     def __handle_ack(self, packet: Packet):
-        window_index = (packet.id - self.tx_base) % MAX_ID
-
-        # Selective acknowledgment
+        # Selective acknowledgment, only sent by parties without separate streams
         if packet.type == MsgType.SACK or packet.type == MsgType.DACK:
-            self.__acknowledge_tx_pid(packet.id)
+            stream = self.streams[DEFAULT_STREAM]
+            self.__acknowledge_tx_pid(stream, packet.id)
+            self.__fast_retransmit(stream, [packet.id])
 
-        # Cumulative acknowledgement
+        # Cumulative acknowledgement, its first data byte names the stream
         elif packet.type == MsgType.CACK:
-            self.__shift_tx_window(window_index + 1)
+            cls = packet.data[0] if packet.data else DEFAULT_STREAM
+            if cls not in self.streams:
+                raise FlowControlError(f'Received CACK (ID: {packet.id}) for unknown stream {cls}.')
+            stream = self.streams[cls]
+            self.__fast_retransmit(stream, self.__handle_cack(stream, packet))
 
-        # Keep shifting tx_window until its base is an unacknowledged packet / None
-        while self.tx_window[0] == "ACK":
-            self.__shift_tx_window(1)
-
-        logger.debug(self.__tx_window_to_str())
+        else:
+            return
 
-    # Sends an acknowledgement with specified type (if specified) using the pid from the provided packet.
-    def __send_ack(self, packet, ack_type=MsgType.SACK):
-        pid = packet.id
-        logger.debug(
-            f"Sending acknowledgement for packet (ID: {pid}) with {ack_type}.")
-        ack_packet = Packet(ptype=ack_type, pid=pid, cmode=packet.cmode)
+        # Slide tx window until its base is an unacknowledged packet
+        self.__slide_tx_window(stream)
+
+        logger.debug(self.__tx_window_to_str(stream))
+
+    # Acknowledges every own packet of stream covered by a CACK: all IDs up to and including its ID, and those flagged
+    # in its bitmap. Packets already acknowledged are skipped, so duplicate / stale CACKs are harmless. Returns the IDs
+    # of the newly acknowledged packets.
+    def __handle_cack(self, stream, packet: Packet):
+        tx_window = stream.tx_window
+        # A stale CACK (ID below the window's base) wraps around past the packets in flight and covers none of them
+        num_cumulative = tx_window.offset(packet.id + 1)
+        if num_cumulative > len(tx_window):
+            num_cumulative = 0
+        pids = [(tx_window.base + i) % MAX_ID for i in range(num_cumulative)]
+
+        # Bit i of the bitmap is set if packet (ID + 2 + i) was received out-of-order
+        bitmap = int.from_bytes(packet.data[1:], 'little')
+        pid = (packet.id + 2) % MAX_ID
+        while bitmap:
+            if bitmap & 1:
+                pids.append(pid)
+            bitmap >>= 1
+            pid = (pid + 1) % MAX_ID
+
+        acked = []
+        for pid in pids:
+            if tx_window.get(pid) is not None:
+                self.__acknowledge_tx_pid(stream, pid)
+                acked.append(pid)
+        return acked
+
+    # Resends unacknowledged packets of stream once FAST_RETRANSMIT_ACKS packets sent after them have been
+    # acknowledged, rather than waiting for their retransmission timeout, as they were most likely lost. Each packet is
+    # only fast retransmitted once, should that copy be lost too it is left to the retransmission timer.
+    def __fast_retransmit(self, stream, acked_pids):
+        if not acked_pids:
+            return
+        t = time.time()
+        packets = []
+        with self.tx_win_lock:
+            for pid in acked_pids:
+                for _, entry in stream.tx_window.entries(stop=pid):
+                    entry.later_acks += 1
+            for _, entry in stream.tx_window.entries():
+                if entry.later_acks >= FAST_RETRANSMIT_ACKS and not entry.fast_retransmitted:
+                    self.cwnd[entry.packet.cmode].lost(entry.timestamp, t)
+                    entry.timestamp = t
+                    entry.retransmitted = True
+                    entry.fast_retransmitted = True
+                    self.rtx_timer.schedule(entry, t + self.rtt[entry.packet.cmode].rto)
+                    packets.append(entry.packet if entry.packet.pool is None else entry.packet.copy())
+
+        if packets:
+            for packet in packets:
+                logger.debug(f"Fast retransmitting packet (ID: {packet.id}).")
+            self.__write_many(packets)
+
+    # Counts an in-order packet towards the stream's next CACK. It is sent once CACK_EVERY packets are waiting, or
+    # RX_CACK_DELAY seconds after the first of them arrived.
+    def __schedule_cack(self, stream, packet: Packet):
+        stream.cack_pending += 1
+        stream.cack_cmode = packet.cmode
+        if stream.cack_pending >= CACK_EVERY:
+            self.__send_cack(stream)
+        elif stream.cack_deadline is None:
+            stream.cack_deadline = time.time() + RX_CACK_DELAY
+
+    # Sends a cumulative ACK for every packet of stream before its rx base. Its data is the stream's TrafficClass,
+    # followed by a little-endian bitmap of the packets received above the rx base, bit i being set if packet
+    # (base + 1 + i) was buffered or delivered out-of-order.
+    def __send_cack(self, stream):
+        bitmap = stream.rx_window.bitmap()
+        pid = (stream.rx_window.base - 1) % MAX_ID
+        logger.debug(f"Sending cumulative acknowledgement (Stream: {stream.cls.name}, ID: {pid}, Bitmap: {bitmap:b}).")
+        data = bytes([stream.cls]) + bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+        ack_packet = self.ctrl_pool.acquire(MsgType.CACK, pid=pid, data=data, cmode=stream.cack_cmode)
+        stream.cack_pending = 0
+        stream.cack_deadline = None
         self.__tx_simple(ack_packet)
 
+    # Payload of own handshakes / handshake responses: supported compression codecs followed by own receive window
+    def __handshake_data(self):
+        return self.compressor.advertisement() + WINDOW_STRUCT.pack(self.window_size)
+
+    # Applies the payload of the other party's handshake / handshake response, see __handshake_data
+    def __negotiate(self, handshake_data):
+        self.compressor.negotiate(handshake_data)
+        offset = len(self.compressor.advertisement())
+        if len(handshake_data) >= offset + WINDOW_STRUCT.size:
+            peer_window = WINDOW_STRUCT.unpack_from(handshake_data, offset)[0]
+        else:
+            peer_window = DEFAULT_PEER_WINDOW
+        logger.debug(f"Other party advertised a window of {peer_window} packets.")
+        for cwnd in self.cwnd.values():
+            cwnd.set_max_window(max(1, min(self.window_size, peer_window)))
+            cwnd.reset()
+
     # Handles logic surrounding reception of handshakes and handshake responses. Either type will change the CommMode
     # to the medium the handshake (response) was received over. Will send a handshake response if packet is a handshake.
     def __recv_handshake(self, packet: Packet):
         if packet.type == MsgType.HANDSHAKE:
             logger.debug(f'Received handshake over {packet.cmode}')
+            self.__negotiate(packet.data)
             if not (self.comm_mode == CommMode.RADIO and packet.cmode == CommMode.SATELLITE):
                 self.comm_mode = packet.cmode
-            # Put handshake in in_queue so app knows connection was made
-            self.in_queue.put(packet)
             # Update transmission bases to sync w/ client
-            self.tx_base = packet.id
-            self.rx_base = (packet.id + 1 % MAX_ID)
-            self.__reset_windows()
+            self.__reset_windows(tx_base=packet.id, rx_base=packet.id + 1)
             # Send unreliable handshake response back to other party
-            response = Packet(ptype=MsgType.HANDSHAKE_RESPONSE, pid=packet.id, cmode=packet.cmode, calc_checksum=True)
-            self.__write(response)
+            response = self.ctrl_pool.acquire(MsgType.HANDSHAKE_RESPONSE, pid=packet.id,
+                                              data=self.__handshake_data(), cmode=packet.cmode)
+            self.__tx_simple(response)
+            # Let app know connection was made
+            self.__connected(packet)
         elif packet.type == MsgType.HANDSHAKE_RESPONSE:
             try:
-                self.__acknowledge_tx_pid(packet.id)
+                self.__acknowledge_tx_pid(self.streams[TrafficClass.CONTROL], packet.id)
                 logger.debug(
                     f'Received acknowledgement over {packet.cmode} for handshake (ID: {packet.id})')
+                self.__negotiate(packet.data)
                 if not (self.comm_mode == CommMode.RADIO and packet.cmode == CommMode.SATELLITE):
                     logger.info(f"Setting comm_mode to {packet.cmode}")
                     self.comm_mode = packet.cmode
-                # Put handshake in in_queue so app knows connection was made
-                self.in_queue.put(packet)
                 # Update transmission bases to sync w/ client
-                self.tx_base = (packet.id + 1 % MAX_ID)
-                self.rx_base = packet.id
-                self.__reset_windows()
-                # Put handshake in in_queue so app knows connection was made
-                self.in_queue.put(packet)
+                self.__reset_windows(tx_base=packet.id + 1, rx_base=packet.id)
+                # Let app know connection was made
+                self.__connected(packet)
             except FlowControlError:
                 logger.debug(f'Received handshake response over {packet.cmode} for handshake (ID: {packet.id})'
                              f', but ID was incorrect.')
         logger.debug(f"CommMode is now: {self.comm_mode}")
 
-    # Finds and resends any expired packets in tx_window
+    # Resends packets in tx_window whose retransmission deadline has passed. Only the expired packets are visited, and
+    # they are written after tx_win_lock is released. Each link whose timer expired has its RTO backed off once.
     def __resend_expired_packets(self):
         t = time.time()
         with self.tx_win_lock:
-            expired_packets = list(filter(lambda x:
-                                          x is not None
-                                          and type(x) != str
-                                          and ((t - x["timestamp"]) > RADIO_TX_TIMEOUT),
-                                          self.tx_window))
-            for packet_tuple in expired_packets:
-                packet = packet_tuple["packet"]
+            expired = self.rtx_timer.pop_expired(t)
+            for cmode in set(entry.packet.cmode for entry in expired):
+                self.rtt[cmode].backoff()
+                self.cwnd[cmode].lost(min(entry.timestamp for entry in expired if entry.packet.cmode == cmode), t)
+                logger.debug(f"Retransmission timeout over {cmode}, RTO is now {self.rtt[cmode].rto:.3f}s, window is "
+                             f"{self.cwnd[cmode].window()} packets.")
+            packets = []
+            for entry in expired:
+                entry.timestamp = t
+                entry.retransmitted = True
+                self.rtx_timer.schedule(entry, t + self.rtt[entry.packet.cmode].rto)
+                # Pooled packets are recycled once ack'd, which may happen while they are being written
+                packets.append(entry.packet if entry.packet.pool is None else entry.packet.copy())
+
+        if packets:
+            for packet in packets:
                 logger.debug(f"Retransmitting packet (ID: {packet.id}).")
-                self.__write(packet)
-                packet_tuple["timestamp"] = t
+            self.__write_many(packets)
 
-    # Retrieves packets from all relevant channels and processes them according to their type and channel
+    # Retrieves all received packets from relevant channels and processes them according to their type and channel
     def __read(self):
         new_packets = []
-        radio_packet = self.radio.read_packet()
-        if radio_packet is not None:
-            new_packets.append(radio_packet)
-
-        if self.comm_mode == CommMode.SATELLITE or self.comm_mode == CommMode.HANDSHAKE:
-            if type(self.satellite) == EmailHandler:
-                # Handle multiple read packets
-                pass
-            elif type(self.satellite) == RockBlockHandler:
-                # Handle single read packet
-                sat_packet = self.satellite.read_packet()
-                if sat_packet is not None:
-                    new_packets.append(sat_packet)
-
-        for packet in new_packets:
+        for cmode, link in self.links.items():
+            # High-latency links are only read while in use or while handshaking
+            if link.latency_class == LatencyClass.HIGH and self.comm_mode not in (cmode, CommMode.HANDSHAKE):
+                continue
+            new_packets.extend(link.read_packets())
+
+        for packet in self.__unbundle_packets(new_packets):
             packet: Packet
             logger.debug(f"Read packet: {packet.type} {packet.cmode}")
-            if packet.type == MsgType.HANDSHAKE or packet.type == MsgType.HANDSHAKE_RESPONSE:
-                self.__recv_handshake(packet)
+            # A stale or out-of-window packet is dropped on its own, the rest of the batch is still processed
+            try:
+                if packet.type == MsgType.HANDSHAKE or packet.type == MsgType.HANDSHAKE_RESPONSE:
+                    self.__recv_handshake(packet)
 
-            elif (self.comm_dict[packet.cmode].reliable or \
-                    (packet.type == MsgType.IMAGE and not self.reliable_img) or \
-                    (packet.type == MsgType.MTR_CMD and not self.reliable_mtr_cmd)) and \
-                    self.comm_mode != CommMode.HANDSHAKE:
-                self.__rx_simple(packet)
+                elif not self.__uses_rdt(packet) and self.comm_mode != CommMode.HANDSHAKE:
+                    self.__rx_simple(packet)
 
-            elif self.comm_mode != CommMode.HANDSHAKE:
-                self.__rx_rdt(packet)
+                elif self.comm_mode != CommMode.HANDSHAKE:
+                    self.__rx_rdt(packet)
+            except FlowControlError as e:
+                logger.warning(f"Dropped {packet.type} (ID: {packet.id}) over {packet.cmode}: {e}")
+
+    # Replaces any BUNDLE packets with the packets they carry. Bundles with an invalid checksum are dropped.
+    def __unbundle_packets(self, packets):
+        if not any(packet.type == MsgType.BUNDLE for packet in packets):
+            return packets
+
+        unbundled = []
+        for packet in packets:
+            if packet.type != MsgType.BUNDLE:
+                unbundled.append(packet)
+            elif packet.checksum != packet.calc_checksum():
+                logger.debug(f"Dropped bundle due to invalid checksum.")
+            else:
+                unbundled.extend(unbundle(packet))
+        return unbundled
 
-    # Write to device based on comm_mode specified in packet object
+    # Write to device based on comm_mode specified in packet object. Small packets may be held by the coalescer and
+    # written later as part of a bundle.
     def __write(self, packet: Packet):
-        comm_mode = packet.cmode
-        if comm_mode == CommMode.SATELLITE:
-            self.satellite.write_packet(packet)
-        elif comm_mode == CommMode.RADIO:
-            self.radio.write_packet(packet)
-
-    # Marks own packet with provided pid as acknowledged. Slides tx_window if pid is at the base of the window.
-    def __acknowledge_tx_pid(self, pid):
-        index = (pid - self.tx_base) % MAX_ID
+        ready = self.coalescer.add(packet)
+        if not ready:
+            # Packet is being held, make sure the egress thread sends it once its hold time is up
+            self.egress_event.set()
+        for packet in ready:
+            self.__write_link(packet)
+
+    # Write to device immediately
+    def __write_link(self, packet: Packet):
+        link = self.links.get(packet.cmode)
+        if link is not None:
+            link.write_packet(packet)
+            self.__count_sent(link, [packet])
+
+    # Writes several packets, batching those bound for the same link into a single write
+    def __write_many(self, packets):
+        for comm_mode, link in self.links.items():
+            batch = [packet for packet in packets if packet.cmode == comm_mode]
+            if batch:
+                link.write_packets(batch)
+                self.__count_sent(link, batch)
+
+    # Adds the encoded size of packets written to link to its byte count
+    def __count_sent(self, link, packets):
+        if link.header_format == HeaderFormat.COMPACT:
+            size = sum(packet.compact_frame_size() for packet in packets)
+        else:
+            size = sum(packet.frame_size() for packet in packets)
+        with self.bytes_lock:
+            self.bytes_sent[link.cmode] += size
+
+    # Marks own packet of stream with provided pid as acknowledged
+    def __acknowledge_tx_pid(self, stream, pid):
+        tx_window = stream.tx_window
+        offset = tx_window.offset(pid)
         # Check to ensure that a valid ack_id was recv'd
-        if index < 0 or index >= self.window_size:
-            raise FlowControlError(f'Received ACK_ID (ID: {self.tx_base + index}) outside of transmission window. '
-                                   f'Expected IDs {self.tx_base}-{self.tx_next_seq_num}')
+        if offset >= self.window_size:
+            raise FlowControlError(f'Received ACK_ID (ID: {pid}) outside of transmission window. '
+                                   f'Expected IDs {tx_window.base}-{tx_window.next_seq}')
 
-        if self.tx_window[index] == "ACK":
+        if offset >= len(tx_window):
             raise FlowControlError(
-                f'Attempted to acknowledge own already ack\'d packet (ID: {self.tx_base + index}).')
+                f'Attempted to acknowledge own unsent packet ({pid}).')
 
-        if self.tx_window[index] is None:
+        if tx_window.is_acked(pid):
             raise FlowControlError(
-                f'Attempted to acknowledge own unsent packet ({self.tx_base + index}).')
+                f'Attempted to acknowledge own already ack\'d packet (ID: {pid}).')
 
         logger.debug(
-            f"Marking own packet (ID: {self.tx_base + index}) as acknowledged.")
+            f"Marking own packet (ID: {pid}) as acknowledged.")
         with self.tx_win_lock:
-            # Replace with ACK
-            self.tx_window[index] = "ACK"
-
-    # Performs a zero-shift left 'amount' times on the tx_window
-    def __shift_tx_window(self, amount):
-        # Places a ceiling on how much the window can shift
-        shift_amount = min(self.window_size, amount)
+            # Mark as ACK'd, recycling the packet if it came from the control pool
+            entry = tx_window.ack(pid)
+            if entry is not None:
+                self.rtx_timer.cancel(entry)
+                self.in_flight[entry.packet.cmode] -= 1
+                # Karn's rule: ACKs of retransmitted packets are ambiguous, so only sample the RTT of the others. The RTO
+                # stays backed off until then.
+                if not entry.retransmitted:
+                    rtt = time.time() - entry.timestamp
+                    self.rtt[entry.packet.cmode].sample(rtt)
+                    self.cwnd[entry.packet.cmode].acknowledged(rtt)
+                else:
+                    self.cwnd[entry.packet.cmode].acknowledged()
+                entry.packet.release()
+        # The congestion window may have grown
+        self.egress_event.set()
+        # Resolved outside tx_win_lock, as it runs the application's callbacks
+        if entry is not None and entry.future is not None:
+            entry.future.packet_done()
+
+    # Slides the stream's tx window past the acknowledged packets at its base, making room for new packets
+    def __slide_tx_window(self, stream):
+        with self.tx_win_lock:
+            count = stream.tx_window.slide()
+        if count:
+            self.egress_event.set()
 
+    # Drops every packet from the tx windows, acknowledged or not
+    def __clear_tx_window(self):
         with self.tx_win_lock:
-            self.tx_base = (self.tx_base + shift_amount) % MAX_ID
-            self.tx_window = self.tx_window[shift_amount:] + \
-                             [None] * shift_amount
-
-    # Delivers in-order packets to application and increments rx_base accordingly
-    def __deliver_rx_window(self):
-        none_index = self.rx_window.index(
-            None) if None in self.rx_window else -1
-        if none_index >= 0:
-            # Deliver up to none_index
-            to_deliver = self.rx_window[0:none_index]
-            self.rx_window = self.rx_window[none_index:] + [None] * none_index
-            self.rx_base = (self.rx_base + none_index) % MAX_ID
-        else:
-            # Entire window is populated, deliver everything
-            to_deliver = self.rx_window
-            self.rx_window = [None] * self.window_size
-            self.rx_base = (self.rx_base + self.window_size) % MAX_ID
-
-        # Filter needed in case of "DEL" placeholder
-        to_deliver = list(filter(lambda x: type(x) == Packet, to_deliver))
-        for item in to_deliver:
-            self.in_queue.put(item)
-
-    # Clears both rx & tx windows.
-    def __reset_windows(self):
-        self.tx_next_seq_num = self.tx_base
-        self.tx_window = [None] * self.window_size
-        self.rx_window = [None] * self.window_size
-
-    # Gives a string interpretation of the tx_window. Helpful for logging / debugging.
-    def __tx_window_to_str(self):
-        list_str = ''
-        for item in self.tx_window:
-            if item is not None and type(item) != str:
-                list_str += f"Packet (ID: {str(item['packet'].id)})"
-            else:
-                list_str += str(item)
-            list_str += ', '
-        return list_str
+            entries = []
+            for stream in self.streams.values():
+                entries.extend(entry for _, entry in stream.tx_window.entries())
+                stream.tx_window.reset(stream.tx_window.next_seq)
+            self.in_flight = dict.fromkeys(self.in_flight, 0)
+            for entry in entries:
+                self.rtx_timer.cancel(entry)
+        self.egress_event.set()
+        self.__fail_entries(entries, "CommHandler stopped before the packet was acknowledged.")
+
+    # Drops every packet waiting to be sent, failing their futures with the given reason and returning pooled ones
+    def __clear_egress_queues(self, reason):
+        packets = self.out_queue.clear()
+        fail_packets(packets, reason)
+        for packet in packets:
+            packet.release()
+
+    # Fails the futures of tx window entries that will no longer be acknowledged and returns pooled packets to their pool
+    def __fail_entries(self, entries, reason):
+        for entry in entries:
+            if entry.future is not None:
+                entry.future.fail(SendError(reason))
+            entry.packet.release()
+
+    # Delivers the stream's in-order packets to application, its rx base moves past them
+    def __deliver_rx_window(self, stream):
+        for packet in stream.rx_window.slide():
+            self.__deliver(packet)
+
+    # Clears the rx & tx windows of every stream, moving them to the provided bases.
+    def __reset_windows(self, tx_base=0, rx_base=0):
+        with self.tx_win_lock:
+            entries = []
+            for stream in self.streams.values():
+                entries.extend(entry for _, entry in stream.tx_window.entries())
+                stream.tx_window.reset(tx_base % MAX_ID)
+            self.in_flight = dict.fromkeys(self.in_flight, 0)
+            self.rtx_timer.clear()
+        self.__fail_entries(entries, "Transmission windows were reset before the packet was acknowledged.")
+        for stream in self.streams.values():
+            stream.rx_window.reset(rx_base % MAX_ID)
+            stream.cack_pending = 0
+            stream.cack_deadline = None
+        self.egress_event.set()
+
+    # Gives a string interpretation of the stream's tx window. Helpful for logging / debugging.
+    def __tx_window_to_str(self, stream):
+        tx_window = stream.tx_window
+        items = []
+        for offset in range(len(tx_window)):
+            pid = (tx_window.base + offset) % MAX_ID
+            items.append("ACK" if tx_window.is_acked(pid) else f"Packet (ID: {pid})")
+        return f"{stream.cls.name}: " + ', '.join(items)
+
+
+# Reliable stream of one TrafficClass: its own sequence space, tx / rx windows and delayed CACK state
+class ReliableStream:
+    def __init__(self, cls: TrafficClass, window_size):
+        self.cls = cls
+        # Sent, un-ack'd packets (TxWindowEntry objects)
+        self.tx_window = TxWindow(window_size)
+        # Received, buffered packets to send to application
+        self.rx_window = RxWindow(window_size)
+        # Delayed cumulative ACK state, only used by the ingress thread
+        self.cack_pending = 0  # Number of in-order packets received since the last CACK
+        self.cack_deadline = None  # Time by which the next CACK must be sent, None if nothing needs acknowledging
+        self.cack_cmode = None  # CommMode of the last packet to acknowledge
+
+
+# Un-ack'd packet held in tx_window alongside the time it was last transmitted and when it is next due to be resent
+class TxWindowEntry:
+    __slots__ = ('packet', 'timestamp', 'deadline', 'retransmitted', 'later_acks', 'fast_retransmitted', 'future')
+
+    def __init__(self, packet: Packet, timestamp: float, future: SendFuture = None):
+        self.packet = packet
+        self.future = future  # SendFuture of the message the packet belongs to, if any
+        self.timestamp = timestamp
+        self.retransmitted = False
+        self.later_acks = 0  # Number of packets sent after this one that have been acknowledged
+        self.fast_retransmitted = False
+        self.deadline = None  # Set by RetransmitTimer, None when not scheduled
+
+
+# Min-heap of tx_window entries keyed by retransmission deadline, so finding expired packets costs O(log n) per expired
+# packet instead of a scan of tx_window. Entries are cancelled lazily: cancelling clears the entry's deadline and the
+# stale heap item is discarded once it reaches the top.
+class RetransmitTimer:
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()  # Tie-breaker, as entries themselves can't be compared
+
+    def schedule(self, entry: TxWindowEntry, deadline):
+        entry.deadline = deadline
+        heapq.heappush(self.heap, (deadline, next(self.counter), entry))
+
+    def cancel(self, entry: TxWindowEntry):
+        entry.deadline = None
+
+    # Earliest deadline of a scheduled entry, or None if nothing is scheduled
+    def next_deadline(self):
+        while self.heap and self.heap[0][2].deadline != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    # Removes and returns every scheduled entry whose deadline is at or before t
+    def pop_expired(self, t):
+        expired = []
+        while self.heap and self.heap[0][0] <= t:
+            deadline, _, entry = heapq.heappop(self.heap)
+            if entry.deadline == deadline:
+                entry.deadline = None
+                expired.append(entry)
+        return expired
+
+    def clear(self):
+        self.heap = []
 
 
 class CommSysError(Exception):
@@ -544,9 +1032,15 @@ def read_debug_string():
             return None
 
 # Debugging stand-in for actual satellite modem
-class dummySatDevice():
-    def __init__(self):
-        self.reliable = True
+class dummySatDevice(Link):
+    cmode = CommMode.SATELLITE
+    mtu = LINK_MTU[CommMode.SATELLITE]
+    header_format = LINK_HEADER_FORMATS[CommMode.SATELLITE]
+    reliable = True
+    latency_class = LatencyClass.HIGH
+    rto = SAT_RTO
+    min_window = SAT_MIN_WINDOW
+    reassembly_timeout = REASSEMBLY_TIMEOUT[CommMode.SATELLITE]
 
     def start(self): print("DummySatDevice Started")
 
@@ -555,4 +1049,7 @@ class dummySatDevice():
     def write_packet(self, packet: Packet): print(
         f"DummySatDevice Sending Packet: (ID: {packet.id}, MsgType: {packet.type})")
 
-    def read_packet(self): print(f"DummySatDevice Received nothing!")
+    def read_packet(self, timeout=0): return None
+
+
+register_link('dummy_sat', dummySatDevice)
@@ -0,0 +1,129 @@
+import logging
+import lzma
+import zlib
+from CommSys.Packet import Packet, MsgType, FLAG_COMPRESSED
+
+# Compression.py
+#
+# Last updated: 10/18/2026
+# Optional per-MsgType payload compression, applied by the CommHandler before a packet is transmitted and undone just
+# before it is delivered to the application. Compressed packets set FLAG_COMPRESSED in their type byte and prefix
+# their payload with a 1-byte codec ID:
+#
+#       ┌──────────┬──────────────────────────┐
+#       | Codec ID | --- Compressed Data ---- |
+#       └──────────┴──────────────────────────┘
+#
+# Each party advertises the codecs it can decode in its HANDSHAKE / HANDSHAKE_RESPONSE payload, and only codecs the
+# other party advertised are used. Parties that send empty handshakes (e.g. older versions) never receive compressed
+# packets.
+
+CODEC_ZLIB = 1  # Raw deflate with PRESET_DICT, best for short TEXT/INFO/ERROR strings
+CODEC_LZMA = 2  # Raw LZMA2, better ratio for larger payloads, no preset dictionary
+
+SUPPORTED_CODECS = (1 << CODEC_ZLIB) | (1 << CODEC_LZMA)
+
+# Payloads shorter than this are never worth compressing
+MIN_COMPRESS_SIZE = 8
+
+# Codec used for each MsgType. Types not listed (e.g. IMAGE, already h264 encoded) are sent as-is.
+DEFAULT_POLICY = {
+    MsgType.TEXT: CODEC_ZLIB,
+    MsgType.INFO: CODEC_ZLIB,
+    MsgType.ERROR: CODEC_ZLIB,
+    MsgType.HEARTBEAT: CODEC_ZLIB,
+    MsgType.UDP: CODEC_LZMA,
+}
+
+# Preset deflate dictionary built from the strings the robot and landbase typically exchange. Deflate favours matches
+# close to the data being compressed, so the most common substrings are placed last.
+PRESET_DICT = (b'Live control has not been enabled yet. Lost connection with landbase. Starting handshake mode. '
+               b'Robot shutting down due to low-power. Low Power Mode. Received packet (ID: of type MsgType. '
+               b'Connection with landbase established! Heartbeat from robot received. Latency: Msg: '
+               b'Failed to Error: error Warning: voltage battery compass latitude longitude '
+               b'GPS coordinates received. Starting autonomous navigation. Stopping autonomous navigation. '
+               b'Starting live control. Stopping live control. 192.168.0.192.168.1.')
+
+LZMA_FILTERS = [{'id': lzma.FILTER_LZMA2, 'preset': 6}]
+
+logger = logging.getLogger(__name__)
+
+
+class CompressionError(Exception):
+    pass
+
+
+def zlib_compress(data):
+    compressor = zlib.compressobj(zlib.Z_BEST_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=PRESET_DICT)
+    return compressor.compress(data) + compressor.flush()
+
+
+def zlib_decompress(data):
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS, zdict=PRESET_DICT)
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+def lzma_compress(data):
+    return lzma.compress(data, format=lzma.FORMAT_RAW, filters=LZMA_FILTERS)
+
+
+def lzma_decompress(data):
+    return lzma.decompress(data, format=lzma.FORMAT_RAW, filters=LZMA_FILTERS)
+
+
+CODECS = {
+    CODEC_ZLIB: (zlib_compress, zlib_decompress),
+    CODEC_LZMA: (lzma_compress, lzma_decompress),
+}
+
+
+class PayloadCompressor:
+    def __init__(self, policy=None):
+        self.policy = dict(DEFAULT_POLICY if policy is None else policy)
+        self.peer_codecs = 0  # Bitmask of codecs the other party advertised it can decode
+
+    # Payload to place in own HANDSHAKE / HANDSHAKE_RESPONSE packets
+    def advertisement(self):
+        return bytes([SUPPORTED_CODECS])
+
+    # Records which codecs the other party can decode, using the payload of its HANDSHAKE / HANDSHAKE_RESPONSE
+    def negotiate(self, handshake_data):
+        self.peer_codecs = (handshake_data[0] & SUPPORTED_CODECS) if len(handshake_data) > 0 else 0
+        logger.debug(f"Negotiated compression codecs: {bin(self.peer_codecs)}")
+
+    # Returns a compressed copy of packet if its MsgType has a negotiated codec and compressing actually saves space,
+    # otherwise returns packet unchanged. The original packet is never modified.
+    def compress(self, packet: Packet):
+        codec = self.policy.get(packet.type)
+        if codec is None or not (self.peer_codecs >> codec) & 1 or packet.flags & FLAG_COMPRESSED or \
+                packet.length < MIN_COMPRESS_SIZE:
+            return packet
+
+        data = bytes([codec]) + CODECS[codec][0](packet.data)
+        if len(data) >= packet.length:
+            return packet
+
+        compressed = packet.copy()
+        compressed.data = data
+        compressed.length = len(data)
+        compressed.flags |= FLAG_COMPRESSED
+        compressed.checksum = compressed.calc_checksum()
+        return compressed
+
+    # Decompresses packet in place if it is flagged as compressed. Raises CompressionError if the payload is invalid.
+    def decompress(self, packet: Packet):
+        if not packet.flags & FLAG_COMPRESSED:
+            return packet
+
+        if packet.length < 1 or packet.data[0] not in CODECS:
+            raise CompressionError(f'Unknown compression codec in packet (ID: {packet.id}, Type: {packet.type})')
+        try:
+            data = CODECS[packet.data[0]][1](packet.data[1:])
+        except (zlib.error, lzma.LZMAError) as e:
+            raise CompressionError(f'Failed to decompress packet (ID: {packet.id}, Type: {packet.type}): {str(e)}')
+
+        packet.data = data
+        packet.length = len(data)
+        packet.flags &= ~FLAG_COMPRESSED
+        packet.checksum = packet.calc_checksum()
+        return packet
@@ -0,0 +1,69 @@
+# CongestionControl.py
+#
+# Last updated: 10/18/2026
+# AIMD congestion window for the selective-repeat ARQ of a single link. The window starts at its initial size and grows
+# by one packet per ACK (slow start) up to the slow start threshold, then by about one packet per window of ACKs
+# (congestion avoidance). A fast retransmission or retransmission timeout halves it, down to the minimum. Losses of
+# packets sent before the last decrease are part of the same congestion event and don't shrink it again. While RTT
+# samples are well above the lowest RTT seen, packets are queueing somewhere along the link, so the window stops
+# growing. The window never exceeds the receiver's advertised window.
+#
+# The initial window is meant to be a window known to be safe for the link, so a fresh connection isn't slowed down by
+# slow start. The minimum is set per link (see Link.min_window): a link that keeps losing packets to congestion (e.g.
+# satellite, where each packet is a whole SBD message) must carry noticeably less load than the initial window.
+
+RTT_QUEUEING_FACTOR = 2  # RTT samples above this multiple of the lowest RTT (plus slack) stop the window from growing
+
+
+class CongestionWindow:
+    # Windows are in packets. max_window is the receiver's advertised window, rtt_slack (in seconds) the delay the
+    # receiver may add before acknowledging a packet. initial_window defaults to min_window.
+    def __init__(self, min_window, max_window, rtt_slack=0.0, initial_window=None):
+        self.min_window = min_window
+        self.max_window = max_window
+        self.rtt_slack = rtt_slack
+        self.initial_window = min_window if initial_window is None else max(min_window, initial_window)
+        self.reset()
+
+    def reset(self):
+        self.cwnd = min(self.initial_window, self.max_window)
+        self.ssthresh = self.max_window
+        self.min_rtt = None
+        self.recovery_time = 0  # Time of the last decrease
+        self.num_decreases = 0
+
+    # Number of packets that may be in flight
+    def window(self):
+        return min(self.max_window, max(self.min_window, int(self.cwnd)))
+
+    # Updates the receiver's advertised window
+    def set_max_window(self, max_window):
+        self.max_window = max_window
+        self.ssthresh = min(self.ssthresh, max_window)
+        self.cwnd = min(self.cwnd, max_window)
+
+    # Grows the window after a packet was acknowledged. rtt is the packet's RTT sample, None if it was retransmitted.
+    def acknowledged(self, rtt=None):
+        if rtt is not None:
+            self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+            if rtt > RTT_QUEUEING_FACTOR * self.min_rtt + self.rtt_slack:
+                return
+        if self.cwnd < self.ssthresh:
+            self.cwnd += 1
+        else:
+            self.cwnd += 1 / self.cwnd
+        # A window larger than the receiver's can't be used, so don't let it build up
+        self.cwnd = min(self.cwnd, self.max_window)
+
+    # Halves the window after a packet last sent at sent_time was found lost (by fast retransmit or a timeout) at time t,
+    # unless the packet was sent before the last decrease
+    def lost(self, sent_time, t):
+        if sent_time < self.recovery_time:
+            return
+        self.ssthresh = max(self.min_window, int(self.cwnd / 2))
+        self.cwnd = self.ssthresh
+        self.recovery_time = t
+        self.num_decreases += 1
+
+    def metrics(self):
+        return {'cwnd': self.window(), 'ssthresh': self.ssthresh, 'decreases': self.num_decreases}
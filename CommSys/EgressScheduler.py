@@ -0,0 +1,210 @@
+import logging
+from collections import deque
+from enum import Enum, IntEnum
+from threading import Lock
+from CommSys.Packet import Packet, MsgType
+from CommSys.Fragmenter import inner_type
+from CommSys.SendFuture import fail_packets
+
+# EgressScheduler.py
+#
+# Last updated: 10/18/2026
+# Multi-class queue of packets waiting to be sent. Each packet is put in a traffic class by its MsgType: control traffic
+# the robot's failsafes depend on (motor commands, control requests, heartbeats, ...), telemetry, and bulk data (images,
+# forwarded UDP datagrams). Classes are served by weighted deficit round robin: every round, each class with packets
+# waiting may send up to its weight times EGRESS_QUANTUM bytes, and within a round higher classes are served first. A
+# motor command therefore only waits for the control packets ahead of it, not for a burst of images, as long as control
+# traffic stays within its share of the link. Likewise, bulk traffic is guaranteed its share and is never starved.
+# Packets within a class are sent in the order they were queued. Packets should already be split to fit the link's MTU
+# (see Fragmenter.py), so each class's share is measured in the frames actually sent.
+#
+# Each class is also a separate reliable stream in CommHandler, with its own sequence numbers and windows, so a lost
+# telemetry or bulk packet never holds back the delivery of control packets sent after it.
+#
+# Stale motor commands, images or positions are worthless, so each MsgType also has a QoS policy deciding what happens to
+# its packets still waiting when a new one is queued: all are kept (RELIABLE_FIFO), the new one replaces the waiting one
+# (REPLACE_PENDING), or the oldest are dropped beyond a depth (DROP_OLDEST). Policies only apply to messages that haven't
+# started being sent, so fragmented messages are never cut short, and packets already in the tx window are unaffected.
+# Packets whose stream has no room in its tx window are left waiting here rather than taken out, so the policies keep
+# applying to them until they can be sent.
+
+
+class TrafficClass(IntEnum):
+    CONTROL = 0
+    TELEMETRY = 1
+    BULK = 2
+
+
+TRAFFIC_CLASS = {
+    MsgType.HANDSHAKE: TrafficClass.CONTROL,
+    MsgType.HANDSHAKE_RESPONSE: TrafficClass.CONTROL,
+    MsgType.SACK: TrafficClass.CONTROL,
+    MsgType.CACK: TrafficClass.CONTROL,
+    MsgType.DACK: TrafficClass.CONTROL,
+    MsgType.MTR_CMD: TrafficClass.CONTROL,
+    MsgType.MTR_SWITCH_CMD: TrafficClass.CONTROL,
+    MsgType.CTRL_REQ: TrafficClass.CONTROL,
+    MsgType.GPS_CMD: TrafficClass.CONTROL,
+    MsgType.HEARTBEAT_REQ: TrafficClass.CONTROL,
+    MsgType.HEARTBEAT: TrafficClass.CONTROL,
+    MsgType.COMM_CHANGE: TrafficClass.CONTROL,
+    MsgType.IMAGE: TrafficClass.BULK,
+    MsgType.UDP: TrafficClass.BULK,
+}  # Other MsgTypes are telemetry
+
+# Share of the link given to each class while all of them have packets waiting
+CLASS_WEIGHTS = {
+    TrafficClass.CONTROL: 4,
+    TrafficClass.TELEMETRY: 2,
+    TrafficClass.BULK: 1,
+}
+
+EGRESS_QUANTUM = 1024  # Bytes a class of weight 1 may send per round, about one radio MTU
+
+logger = logging.getLogger(__name__)
+
+
+# What happens to packets of a MsgType that are still waiting to be sent when newer ones are queued
+class QosPolicy(Enum):
+    RELIABLE_FIFO = 0  # Every packet is sent, in order
+    REPLACE_PENDING = 1  # A new packet replaces the one waiting, taking its place in the queue (latest value wins)
+    DROP_OLDEST = 2  # Once more than 'depth' messages are waiting, the oldest ones are dropped
+
+
+# (QosPolicy, depth) of each MsgType, others are RELIABLE_FIFO. Depths count messages, i.e. all fragments of a packet.
+QOS_POLICIES = {
+    MsgType.MTR_CMD: (QosPolicy.REPLACE_PENDING, 1),
+    MsgType.HEARTBEAT: (QosPolicy.REPLACE_PENDING, 1),
+    MsgType.HEARTBEAT_REQ: (QosPolicy.REPLACE_PENDING, 1),
+    MsgType.GPS_DATA: (QosPolicy.REPLACE_PENDING, 1),
+    MsgType.IMAGE: (QosPolicy.DROP_OLDEST, 2),
+    MsgType.UDP: (QosPolicy.DROP_OLDEST, 64),
+}
+
+
+# Returns the TrafficClass of packet, using the original MsgType of fragments
+def traffic_class(packet: Packet):
+    return TRAFFIC_CLASS.get(inner_type(packet), TrafficClass.TELEMETRY)
+
+
+# A message (a packet, or all fragments of one) waiting in the scheduler
+class PendingMessage:
+    __slots__ = ('ptype', 'packets', 'started')
+
+    def __init__(self, ptype: MsgType, packets):
+        self.ptype = ptype
+        self.packets = deque(packets)
+        self.started = False  # Set once its first packet has been sent, after which QoS policies no longer apply
+
+
+class EgressScheduler:
+    def __init__(self, weights=None, qos=None):
+        weights = CLASS_WEIGHTS if weights is None else weights
+        self.quantum = [weights[cls] * EGRESS_QUANTUM for cls in TrafficClass]
+        self.qos = dict(QOS_POLICIES if qos is None else qos)
+        self.queues = [deque() for _ in TrafficClass]  # PendingMessages of each class, in order
+        self.pending = {}  # MsgType -> unstarted PendingMessages of that type, in order
+        self.deficit = list(self.quantum)  # Bytes each class may still send this round
+        self.num_packets = 0
+        self.num_dropped = 0  # Packets discarded by QoS policies
+        self.lock = Lock()  # Packets are put by the application and taken by the egress thread
+
+    def __len__(self):
+        return self.num_packets
+
+    # Number of packets waiting, for compatibility with queue.Queue
+    def qsize(self):
+        return self.num_packets
+
+    def empty(self):
+        return self.num_packets == 0
+
+    # Sets the QoS policy applied to packets of MsgType ptype, depth being the number of messages kept by DROP_OLDEST
+    def set_qos(self, ptype: MsgType, policy: QosPolicy, depth=1):
+        with self.lock:
+            self.qos[ptype] = (policy, depth)
+
+    # Queues packet behind the others of its class, subject to the QoS policy of its MsgType
+    def put(self, packet: Packet):
+        self.put_many([packet])
+
+    # Queues packets as a single message (e.g. the fragments of one packet) behind the others of their class, subject
+    # to the QoS policy of their MsgType. The packets are sent in order.
+    def put_many(self, packets):
+        ptype = inner_type(packets[0])
+        policy, depth = self.qos.get(ptype, (QosPolicy.RELIABLE_FIFO, None))
+        dropped = []
+        with self.lock:
+            pending = self.pending.setdefault(ptype, deque())
+            if policy == QosPolicy.REPLACE_PENDING and pending:
+                # Take over the place of the message already waiting
+                message = pending[-1]
+                dropped.extend(message.packets)
+                message.packets = deque(packets)
+            else:
+                message = PendingMessage(ptype, packets)
+                pending.append(message)
+                self.queues[traffic_class(packets[0])].append(message)
+                if policy == QosPolicy.DROP_OLDEST:
+                    while len(pending) > depth:
+                        oldest = pending.popleft()
+                        dropped.extend(oldest.packets)
+                        oldest.packets.clear()  # Skipped once it reaches the front of its queue
+            self.num_packets += len(packets) - len(dropped)
+            self.num_dropped += len(dropped)
+
+        if dropped:
+            logger.debug(f"Dropped {len(dropped)} pending {ptype} packet(s) ({policy}).")
+            fail_packets(dropped, f"Dropped by the {policy.name} QoS policy of {ptype.name} before being sent.")
+        for packet in dropped:
+            packet.release()
+
+    # Pops and returns the next packet to send, or None if no packets are waiting. If given, ready(packet) tells whether
+    # the packet at the front of a class can be sent now (e.g. whether its reliable stream's tx window has room). Classes
+    # that can't are skipped and keep their packets, so QoS policies still apply to them while they wait.
+    def get(self, ready=None):
+        with self.lock:
+            if self.num_packets == 0:
+                return None
+            while True:
+                # Classes whose next packet may be sent now
+                active = [False] * len(self.queues)
+                for cls, queue in enumerate(self.queues):
+                    while queue and not queue[0].packets:
+                        queue.popleft()
+                    active[cls] = bool(queue) and (ready is None or ready(queue[0].packets[0]))
+                if not any(active):
+                    return None
+                # Highest class whose next packet fits in what it may still send this round
+                for cls, queue in enumerate(self.queues):
+                    if active[cls] and queue[0].packets[0].frame_size() <= self.deficit[cls]:
+                        return self.__pop(cls, queue)
+                # Start a new round. Classes without packets ready to send don't build up more than one round's
+                # quantum, so a packet that becomes ready for them mid-round can be sent straight away.
+                for cls in range(len(self.queues)):
+                    self.deficit[cls] = self.deficit[cls] + self.quantum[cls] if active[cls] else self.quantum[cls]
+
+    # Removes and returns every waiting packet
+    def clear(self):
+        with self.lock:
+            packets = [packet for queue in self.queues for message in queue for packet in message.packets]
+            for queue in self.queues:
+                queue.clear()
+            self.pending = {}
+            self.deficit = list(self.quantum)
+            self.num_packets = 0
+        return packets
+
+    # Pops the next packet of the message at the front of queue, charging it to class cls
+    def __pop(self, cls, queue):
+        message = queue[0]
+        if not message.started:
+            message.started = True
+            # Messages of one MsgType are always in the same class queue, so this is the oldest pending one
+            self.pending[message.ptype].popleft()
+        packet = message.packets.popleft()
+        if not message.packets:
+            queue.popleft()
+        self.deficit[cls] -= packet.frame_size()
+        self.num_packets -= 1
+        return packet
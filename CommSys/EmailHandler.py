@@ -8,33 +8,50 @@ import sched
 import time
 import email
 import smtplib
+from threading import Thread, Event
 import ssl
 from email import encoders
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from CommSys.Packet import Packet, SYNC_WORD, MIN_PACKET_SIZE, PacketError
+from CommSys.CommMode import CommMode
+from CommSys.Packet import Packet, decode_stream, encode_many, split_batches, LINK_HEADER_FORMATS
+from CommSys.Fragmenter import LINK_MTU, REASSEMBLY_TIMEOUT
+from CommSys.RockBlockHandler import SAT_RTO, SAT_MIN_WINDOW
+from CommSys.PacketQueue import PacketQueue
+from CommSys.Link import Link, LatencyClass, register_link
 
 # EmailHandler.py
 #
-# Last updated: 04/26/2022
+# Last updated: 10/18/2026
 # Allows the landbase to communiate with satellite via email. Packets can be sent using write_packet and
 # an email will be created and sent using the gmail information that it is provided. Any messges sent from
 # the satellite will be delievered to the email registered with the satellite. The email will have an attatchment
-# that contains the body of the message. The read_packet function that will read any unread emails and if they are
-# from the iridium service, it will try to read the message and turn it in to a packet that is able to be read
-# by the CommSys
+# that contains the body of the message. Once started, a thread reads any unread emails every EMAIL_POLL_INTERVAL
+# seconds and if they are from the iridium service, it will try to read the message and turn it in to a packet that is
+# able to be read by the CommSys. read_packet only pops the packets it found, so IMAP never blocks the CommHandler.
 #
 # TODO List:
 # - Verify with satellite
 
+EMAIL_POLL_INTERVAL = 30  # Min time (in seconds) between two fetches of unread emails
 
 logger = logging.getLogger(__name__)
 
 
-class EmailHandler():
+class EmailHandler(Thread, Link):
+    cmode = CommMode.SATELLITE
+    mtu = LINK_MTU[CommMode.SATELLITE]
+    header_format = LINK_HEADER_FORMATS[CommMode.SATELLITE]
+    reliable = True
+    cost_per_byte = 1 / 50
+    latency_class = LatencyClass.HIGH
+    rto = SAT_RTO
+    min_window = SAT_MIN_WINDOW
+    reassembly_timeout = REASSEMBLY_TIMEOUT[CommMode.SATELLITE]
+
     def __init__(self, username, password):
-        self.reliable = True
+        super(EmailHandler, self).__init__(daemon=True)
         self.username = username
         self.password = password
         self.mail = imaplib.IMAP4_SSL('imap.gmail.com')
@@ -42,11 +59,39 @@ class EmailHandler():
         self.emailPort = 465  # For SSL
         self.context = ssl.create_default_context()
 
+        # Packets fetched but not read yet
+        self.received_packets = PacketQueue()
+        self.stopped = Event()
+
+    # Logs in, then starts fetching unread emails in the background
     def start(self):
         (retcode, capabilities) = self.mail.login(self.username, self.password)
         self.mail.select("INBOX")
+        super(EmailHandler, self).start()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.received_packets.put_many(self.fetch_packets())
+            except Exception:
+                # A failed fetch is retried at the next poll
+                logger.exception("Failed to fetch unread emails.")
+            self.stopped.wait(EMAIL_POLL_INTERVAL)
+
+    # Pops the oldest received packet, waiting up to timeout seconds for one (forever if None). Returns None if no
+    # packet arrived in time.
+    def read_packet(self, timeout=0):
+        return self.received_packets.get(timeout)
 
     def read_packets(self):
+        return self.received_packets.get_all()
+
+    # Registers a threading.Event to be set whenever a packet is received
+    def add_rx_listener(self, event):
+        self.received_packets.add_listener(event)
+
+    # Returns the packets found in unread emails from the iridium service
+    def fetch_packets(self):
         recieved_packets = []
 
         status, messages = self.mail.uid('search', None, "UNSEEN")
@@ -99,30 +144,9 @@ class EmailHandler():
                                 print("ATTATCHMENT")
                                 message = part.get_payload(decode=True)
                                 print(message)
-                                # Try to make a packet from read_buf
-                                try:
-                                    packet = Packet(data=message)
-                                    if packet.checksum == packet.calc_checksum():
-                                        # Valid packet was created
-                                        recieved_packets.append(packet)
-                                        message = message[(
-                                            packet.length + MIN_PACKET_SIZE):]
-                                    else:
-                                        logger.debug(f"SerialHandler dropped packet (ID: {packet.id}) due to invalid checksum. "
-                                                     f"Expected: {packet.checksum}, Actual: {packet.calc_checksum()}")
-                                        logger.debug(
-                                            f"Bad packet: {packet.to_binary()[0:32]}")
-                                        # Force jump to next syncword
-                                        self.read_buf = self.read_buf[len(
-                                            SYNC_WORD):]
-                                except PacketError as e:
-                                    pass
-                                except ValueError:  # Invalid MsgType was given
-                                    logger.debug(
-                                        f"SerialHandler dropped packet due to invalid MsgType")
-                                    # Force jump to next syncword
-                                    self.read_buf = self.read_buf[len(
-                                        SYNC_WORD):]
+                                # Decode every packet found in the attachment
+                                recieved_packets.extend(decode_stream(
+                                    message, cmode=self.cmode, header_format=self.header_format))
                     else:
                         # extract content type of eself.mail
                         content_type = msg.get_content_type()
@@ -135,46 +159,62 @@ class EmailHandler():
         return recieved_packets
 
     def write_packet(self, packet: Packet):
+        self.write_packets([packet])
+
+    # Sends packets in as few email attachments (i.e. SBD messages) as possible, each holding at most LINK_MTU bytes
+    def write_packets(self, packets):
+        header_format = self.header_format
         with smtplib.SMTP_SSL("smtp.gmail.com", self.emailPort, context=self.context) as server:
             server.login(self.username, self.password)
 
-            # TODO: Send email here
-            sender_email = "iridium.yanglab@gmail.com"
-            receiver_email = "data@sbd.iridium.com"
-            subject = "300434065957410"
+            for batch in split_batches(packets, self.mtu, header_format):
+                # TODO: Send email here
+                sender_email = "iridium.yanglab@gmail.com"
+                receiver_email = "data@sbd.iridium.com"
+                subject = "300434065957410"
 
-            message = MIMEMultipart()
-            message["From"] = sender_email
-            message["To"] = receiver_email
-            message["Subject"] = subject
+                message = MIMEMultipart()
+                message["From"] = sender_email
+                message["To"] = receiver_email
+                message["Subject"] = subject
 
-            data = os.getcwd() + '\\CommSys\\message.sbd'
+                data = os.getcwd() + '\\CommSys\\message.sbd'
 
-            with open(data, 'wb') as f:
-                f.write(packet.to_binary())
+                with open(data, 'wb') as f:
+                    f.write(encode_many(batch, header_format))
 
-            with open(data, "rb") as attachment:
-                # Add file as application/octet-stream
-                # Email client can usually download this automatically as attachment
-                part = MIMEBase("application", "octet-stream")
-                part.set_payload(attachment.read())
+                with open(data, "rb") as attachment:
+                    # Add file as application/octet-stream
+                    # Email client can usually download this automatically as attachment
+                    part = MIMEBase("application", "octet-stream")
+                    part.set_payload(attachment.read())
 
-            encoders.encode_base64(part)
+                encoders.encode_base64(part)
 
-            # Add header as key/value pair to attachment part
-            part.add_header(
-                "Content-Disposition",
-                f"attachment; filename= message.sbd",
-            )
+                # Add header as key/value pair to attachment part
+                part.add_header(
+                    "Content-Disposition",
+                    f"attachment; filename= message.sbd",
+                )
 
-            message.attach(part)
-            text = message.as_string()
+                message.attach(part)
+                text = message.as_string()
 
-            server.sendmail(sender_email, receiver_email, text)
+                server.sendmail(sender_email, receiver_email, text)
 
     def close(self):
+        self.stop()
         self.logout()
 
+    # Stops fetching emails, waiting for a fetch in progress to finish
+    def stop(self):
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+
     def logout(self):
         self.mail.close()
         self.mail.logout()
+
+
+register_link('email', EmailHandler)
@@ -0,0 +1,172 @@
+import logging
+import struct
+import time
+from threading import Lock
+from CommSys.CommMode import CommMode
+from CommSys.Packet import Packet, MsgType, PacketError, HeaderFormat, LINK_HEADER_FORMATS, MIN_PACKET_SIZE, \
+    MSG_TYPE_LOOKUP, TYPE_MASK, NUM_ID_BYTES, varint_size
+
+# Fragmenter.py
+#
+# Last updated: 10/18/2026
+# Splits packets that are larger than a link's MTU into FRAGMENT packets, and reassembles them on the receiving side.
+# Fragments are sent like any other packet (with or without RDT depending on the original MsgType), so the egress
+# thread can interleave them with smaller packets instead of monopolizing the link with a single large frame. Each
+# fragment's payload starts with a fragment header:
+#
+#       ┌───────────────┬────────────┬──────────┬──────────┬──────────────────────┐
+#       | Original Type | Message ID | Index    | Count    | --- Payload Slice -- |
+#       | (1B)          | (2B)       | (2B)     | (2B)     |                      |
+#       └───────────────┴────────────┴──────────┴──────────┴──────────────────────┘
+#
+# The original type byte keeps its flag bits (e.g. FLAG_COMPRESSED), so compression is undone after reassembly.
+
+FRAGMENT_HEADER = struct.Struct('>BHHH')
+
+MAX_MESSAGE_ID = pow(2, 16)
+
+# Largest encoded packet (header included) sent over each link. Iridium SBD accepts 340 B mobile-originated and 270 B
+# mobile-terminated messages, the smaller is used so fragments fit in either direction.
+LINK_MTU = {
+    CommMode.RADIO: 1024,
+    CommMode.SATELLITE: 270,
+}
+
+# Seconds a partially received message is kept before it is discarded. Satellite fragments may arrive several SBD
+# sessions apart.
+REASSEMBLY_TIMEOUT = {
+    CommMode.RADIO: 10,
+    CommMode.SATELLITE: 1800,
+}
+
+# Maximum number of messages being reassembled at once, the oldest is discarded to make room for a new one
+MAX_REASSEMBLIES = 16
+
+logger = logging.getLogger(__name__)
+
+
+# Largest payload slice that fits in a single fragment sent over a link with the given MTU and header format
+def max_fragment_data(mtu, header_format=HeaderFormat.STANDARD):
+    if header_format == HeaderFormat.COMPACT:
+        overhead = 1 + varint_size(pow(2, 8 * NUM_ID_BYTES) - 1) + varint_size(mtu)
+    else:
+        overhead = MIN_PACKET_SIZE
+    return mtu - overhead - FRAGMENT_HEADER.size
+
+
+class Fragmenter:
+    # mtu and header_format are dicts of CommMode -> MTU / header format of its link, LINK_MTU / LINK_HEADER_FORMATS if
+    # None. Packets bound for a CommMode without an MTU are never split.
+    def __init__(self, mtu=None, header_format=None):
+        self.mtu = dict(LINK_MTU if mtu is None else mtu)
+        self.header_format = dict(LINK_HEADER_FORMATS if header_format is None else header_format)
+        self.next_message_id = 0
+        self.lock = Lock()  # Packets may be split by several application threads at once
+
+    # Returns True if packet's encoded size exceeds the MTU of the link it will be sent over
+    def needs_split(self, packet: Packet):
+        mtu = self.mtu.get(packet.cmode)
+        if mtu is None:
+            return False
+        if self.header_format.get(packet.cmode) == HeaderFormat.COMPACT:
+            return packet.compact_frame_size() > mtu
+        return packet.frame_size() > mtu
+
+    # Returns a list of FRAGMENT packets carrying packet's payload. Checksums and IDs are set when each is transmitted.
+    def split(self, packet: Packet):
+        with self.lock:
+            message_id = self.next_message_id
+            self.next_message_id = (self.next_message_id + 1) % MAX_MESSAGE_ID
+
+        size = max_fragment_data(self.mtu[packet.cmode], self.header_format.get(packet.cmode, HeaderFormat.STANDARD))
+        data = memoryview(packet.data)
+        count = (packet.length + size - 1) // size
+        ptype = packet.type.value[0] | packet.flags
+        fragments = []
+        for index in range(count):
+            header = FRAGMENT_HEADER.pack(ptype, message_id, index, count)
+            fragments.append(Packet(MsgType.FRAGMENT, data=header + data[index * size: (index + 1) * size],
+                                    cmode=packet.cmode))
+
+        logger.debug(f"Split packet (Type: {packet.type}, Length: {packet.length}) into {count} fragments "
+                     f"(Message ID: {message_id}).")
+        return fragments
+
+
+# Fragments received so far for a single message
+class ReassemblyEntry:
+    __slots__ = ('ptype', 'parts', 'remaining', 'expire')
+
+    def __init__(self, ptype, count, expire):
+        self.ptype = ptype
+        self.parts = [None] * count
+        self.remaining = count
+        self.expire = expire
+
+
+class Reassembler:
+    # timeout is a dict of CommMode -> reassembly timeout of its link, REASSEMBLY_TIMEOUT if None
+    def __init__(self, max_reassemblies=MAX_REASSEMBLIES, timeout=None):
+        self.max_reassemblies = max_reassemblies
+        self.timeout = dict(REASSEMBLY_TIMEOUT if timeout is None else timeout)
+        self.entries = {}  # (CommMode, message ID) -> ReassemblyEntry
+
+    # Adds a FRAGMENT packet. Returns the reassembled packet once all of its fragments were received, otherwise None.
+    def add(self, packet: Packet):
+        if packet.length < FRAGMENT_HEADER.size:
+            logger.debug(f"Dropped fragment (ID: {packet.id}) that is too short to hold a fragment header.")
+            return None
+
+        ptype, message_id, index, count = FRAGMENT_HEADER.unpack_from(packet.data)
+        if index >= count or (ptype & TYPE_MASK) not in MSG_TYPE_LOOKUP:
+            logger.debug(f"Dropped invalid fragment (ID: {packet.id}, Message ID: {message_id}).")
+            return None
+
+        t = time.time()
+        self.purge(t)
+
+        key = (packet.cmode, message_id)
+        entry = self.entries.get(key)
+        if entry is None or entry.ptype != ptype or len(entry.parts) != count:
+            # New message, or the message ID wrapped around onto a stale entry
+            if entry is None and len(self.entries) >= self.max_reassemblies:
+                oldest = min(self.entries, key=lambda k: self.entries[k].expire)
+                logger.debug(f"Discarding incomplete message (Message ID: {oldest[1]}) to make room.")
+                del self.entries[oldest]
+            entry = ReassemblyEntry(ptype, count, t + self.timeout.get(packet.cmode, 0))
+            self.entries[key] = entry
+
+        if entry.parts[index] is None:
+            entry.parts[index] = bytes(packet.data[FRAGMENT_HEADER.size:])
+            entry.remaining -= 1
+        if entry.remaining > 0:
+            return None
+
+        del self.entries[key]
+        try:
+            message = Packet(MSG_TYPE_LOOKUP[ptype & TYPE_MASK], pid=packet.id, data=b''.join(entry.parts),
+                             cmode=packet.cmode)
+        except PacketError as e:
+            logger.warning(f"Failed to reassemble message (Message ID: {message_id}): {str(e)}")
+            return None
+        message.flags = ptype & ~TYPE_MASK
+        message.checksum = message.calc_checksum()
+        logger.debug(f"Reassembled packet (Type: {message.type}, Length: {message.length}) from {count} fragments.")
+        return message
+
+    # Discards partially received messages whose timeout has passed
+    def purge(self, t=None):
+        t = time.time() if t is None else t
+        for key in [key for key, entry in self.entries.items() if entry.expire < t]:
+            logger.debug(f"Reassembly of message (Message ID: {key[1]}) timed out.")
+            del self.entries[key]
+
+    def reset(self):
+        self.entries = {}
+
+
+# Returns the MsgType a packet is carrying, i.e. the original type for FRAGMENT packets
+def inner_type(packet: Packet):
+    if packet.type == MsgType.FRAGMENT and packet.length > 0:
+        return MSG_TYPE_LOOKUP.get(packet.data[0] & TYPE_MASK, packet.type)
+    return packet.type
@@ -0,0 +1,133 @@
+import threading
+from enum import Enum
+from CommSys.CommMode import CommMode
+from CommSys.Packet import Packet, HeaderFormat
+from CommSys.Fragmenter import LINK_MTU, REASSEMBLY_TIMEOUT
+from CommSys.PacketQueue import PacketQueue
+
+# Link.py
+#
+# Last updated: 10/18/2026
+# Interface shared by every transport the CommHandler sends packets over (SerialHandler, RockBlockHandler, EmailHandler,
+# simulators, ...), and a registry of link types. The CommHandler only talks to its links through this interface, so a
+# new transport or simulator is added by subclassing Link and registering it, without editing CommHandler:
+#
+#     register_link('loopback', LoopbackLink)
+#     comm = CommHandler(links={CommMode.RADIO: create_link('loopback', delay=0.05)})
+#
+# A link describes itself with class (or instance) attributes: the CommMode it carries, its MTU and header format,
+# whether the medium itself guarantees delivery (RDT isn't used over reliable links), what a byte costs to send, its
+# latency class, retransmission timeout bounds, congestion window floor and reassembly timeout. The CommHandler sizes
+# fragments, timers and windows from them, so a link may carry any CommMode.
+# read_packet(timeout) doesn't block by default, waits up to timeout seconds for a packet otherwise (forever if None),
+# and read_packets() returns everything received so far in one call. Writes return once the link has accepted the
+# packets.
+
+
+class LatencyClass(Enum):
+    LOW = 0  # Round trips well under a second (e.g. radio). Always read by the CommHandler.
+    HIGH = 1  # Round trips of seconds to minutes (e.g. satellite). Only read while in use or while handshaking.
+
+
+class Link:
+    cmode = CommMode.RADIO
+    mtu = LINK_MTU[CommMode.RADIO]  # Largest encoded packet (header included) written in a single frame
+    header_format = HeaderFormat.STANDARD  # Header of packets written over the link, sets how much data fits in a frame
+    reliable = False  # True if the medium guarantees delivery, so packets are sent over it without RDT
+    cost_per_byte = 0  # Cost of sending a byte, in RockBLOCK credits (1 credit per 50 B of an SBD message)
+    latency_class = LatencyClass.LOW
+    rto = (2.5, 0.25, 5)  # Initial, minimum and maximum retransmission timeout (in seconds), the RTO adapts to the RTT
+    # Smallest congestion window (in packets). Most radio losses are noise rather than congestion, and windows below the
+    # initial one (CommHandler.INITIAL_WINDOW) then only slow down delivery.
+    min_window = 8
+    reassembly_timeout = REASSEMBLY_TIMEOUT[CommMode.RADIO]  # Seconds a partially received message is kept
+
+    def start(self): pass
+
+    def close(self): pass
+
+    def write_packet(self, packet: Packet):
+        raise NotImplementedError
+
+    # Writes several packets, links that can should send them in as few frames as possible
+    def write_packets(self, packets):
+        for packet in packets:
+            self.write_packet(packet)
+
+    # Pops the oldest received packet, waiting up to timeout seconds for one (forever if None). Returns None if no
+    # packet arrived in time.
+    def read_packet(self, timeout=0):
+        raise NotImplementedError
+
+    # Returns every packet received so far, without waiting
+    def read_packets(self):
+        packets = []
+        packet = self.read_packet()
+        while packet is not None:
+            packets.append(packet)
+            packet = self.read_packet()
+        return packets
+
+    # Registers a threading.Event to be set whenever a packet is received. Links that can't notify (e.g. ones that poll
+    # a server) are read at least every INGRESS_WAIT seconds instead.
+    def add_rx_listener(self, event): pass
+
+
+# Link type name -> callable returning a new Link, see register_link
+LINK_TYPES = {}
+
+
+# Registers factory (usually a Link subclass) under name, so create_link(name, ...) returns factory(...)
+def register_link(name, factory):
+    LINK_TYPES[name] = factory
+
+
+# Creates a link of the type registered under name, passing any other arguments on to its factory
+def create_link(name, *args, **kwargs):
+    if name not in LINK_TYPES:
+        raise ValueError(f"Unknown link type '{name}', registered types are: {', '.join(sorted(LINK_TYPES))}")
+    return LINK_TYPES[name](*args, **kwargs)
+
+
+# In-memory link simulator, delivering packets written to it to its peer after 'delay' seconds unless drop(packet)
+# returns True. Pairs of them stand in for real links in benchmarks and tests:
+#
+#     a, b = create_link('loopback', delay=0.05), create_link('loopback', delay=0.05)
+#     a.connect(b)
+#
+# It may carry any CommMode, its MTU defaults to that of the CommMode's real link (if any). Other attributes keep the
+# Link defaults unless set on the instance.
+class LoopbackLink(Link):
+    def __init__(self, delay=0.0, drop=None, cmode=CommMode.RADIO, mtu=None, latency_class=LatencyClass.LOW):
+        self.cmode = cmode
+        self.mtu = LINK_MTU.get(cmode, Link.mtu) if mtu is None else mtu
+        self.latency_class = latency_class
+        self.delay = delay
+        self.drop = drop
+        self.peer = None
+        self.received_packets = PacketQueue()
+
+    # Connects this link and peer to each other
+    def connect(self, peer):
+        self.peer, peer.peer = peer, self
+
+    def write_packet(self, packet: Packet):
+        if self.peer is None or (self.drop is not None and self.drop(packet)):
+            return
+        received = Packet(data=packet.to_binary(), cmode=self.peer.cmode)
+        if self.delay > 0:
+            threading.Timer(self.delay, self.peer.received_packets.put, [received]).start()
+        else:
+            self.peer.received_packets.put(received)
+
+    def read_packet(self, timeout=0):
+        return self.received_packets.get(timeout)
+
+    def read_packets(self):
+        return self.received_packets.get_all()
+
+    def add_rx_listener(self, event):
+        self.received_packets.add_listener(event)
+
+
+register_link('loopback', LoopbackLink)
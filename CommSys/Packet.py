@@ -1,4 +1,5 @@
 from enum import Enum
+from collections import deque
 import numpy as np
 import struct
 from CommSys.CommMode import CommMode
@@ -9,7 +10,7 @@ b = struct.pack('f', value)
 
 # Packet.py
 #
-# Last updated: 04/12/2022 | Primary Contact: Michael Fuhrer, mfuhrer@vt.edu
+# Last updated: 10/18/2026 | Primary Contact: Michael Fuhrer, mfuhrer@vt.edu
 # Triton Datagram implementation. Contains a low-overhead packet header and functions to convert packets
 # to/from byte strings.
 #
@@ -21,6 +22,13 @@ b = struct.pack('f', value)
 #       | -------------- Data ------------- |
 #       |                 ...               |
 #       └───────────────────────────────────┘
+#
+# Links that already frame and checksum each message (Iridium SBD) use a compact header instead, which drops the sync
+# word and checksum and encodes the ID and length as varints (little-endian base 128, 7 bits per byte):
+#
+#       ┌──────────┬─────────────┬─────────────────┬──────────┐
+#       | - Type - | ID (varint) | Length (varint) | - Data - |
+#       └──────────┴─────────────┴─────────────────┴──────────┘
 
 NUM_SYNC_BYTES = 4
 NUM_TYPE_BYTES = 1
@@ -34,6 +42,34 @@ MAX_DATA_SIZE = pow(2, (8 * NUM_LEN_BYTES))
 
 SYNC_WORD = b'\xAA' * NUM_SYNC_BYTES
 
+# Frames at least this long (in bytes) are checksummed with NumPy, shorter frames use the pure-Python fast path
+CKSM_NUMPY_THRESHOLD = 1024
+
+# Size (in bytes) of the receive buffer a StreamDecoder decodes packets in place from
+STREAM_BUFFER_SIZE = 65536
+
+# Number of preallocated packets in a PacketPool
+CONTROL_POOL_SIZE = 16
+
+# Flag bits carried in the upper bits of the type byte, below which is the MsgType itself
+FLAG_COMPRESSED = 0x80  # Payload is compressed, see Compression.py
+TYPE_MASK = 0x7F
+
+# Header encodings, selected per link by LINK_HEADER_FORMATS
+class HeaderFormat(Enum):
+    STANDARD = 0
+    COMPACT = 1
+
+
+LINK_HEADER_FORMATS = {
+    CommMode.RADIO: HeaderFormat.STANDARD,
+    CommMode.SATELLITE: HeaderFormat.COMPACT,
+}
+
+# Precompiled header layout: sync word, type, ID (high byte, low 16 bits), checksum, length
+HEADER_STRUCT = struct.Struct('>4sBBH2sH')
+LENGTH_STRUCT = struct.Struct('>H')
+
 
 class PacketError(Exception):
     pass
@@ -63,12 +99,23 @@ class MsgType(Enum):
     HEARTBEAT = b'\x11'     # Basic heartbe
 
     COMM_CHANGE = b'\x12'   # Notifies other party of a mode change, FORCES change, unlike handshakes
+    FRAGMENT = b'\x13'      # Part of a message larger than the link's MTU, see Fragmenter.py
+    BUNDLE = b'\x14'        # Several small packets sharing one frame, see Coalescer.py
+
+
+# Maps the integer value of a header's type byte to its MsgType
+MSG_TYPE_LOOKUP = {t.value[0]: t for t in MsgType}
 
 
 class Packet:
+    __slots__ = ('cmode', 'type', 'flags', 'id', 'checksum', 'length', '_data', '_data_sum', 'pool', 'future')
+
     def __init__(self, ptype: MsgType = MsgType.NULL, pid=0, data: bytes = b'', calc_checksum=False, cmode:CommMode=None):
         self.cmode = cmode  # Used by CommHandler to a. force tx of packet across medium or b. indicate which medium
                             # packet was rx'd through.
+        self.pool = None  # PacketPool the packet was acquired from, if any
+        self.future = None  # SendFuture resolved once the packet is delivered, set by CommHandler.send_packet
+        self.flags = 0  # FLAG_* bits sent alongside the MsgType
 
         # Parameterized Constructor, requires only ptype be set
         if ptype != MsgType.NULL:
@@ -86,48 +133,337 @@ class Packet:
                 self.checksum = self.calc_checksum()
 
         # From-Binary Constructor
-        elif len(data) >= MIN_PACKET_SIZE:
-            if data[0:NUM_SYNC_BYTES] != SYNC_WORD:
-                raise PacketError(f'Failed to create packet,'
-                                  f'invalid sync word: {data[0:4]}')
-            index = NUM_SYNC_BYTES
-            self.type = MsgType(data[index: index + NUM_TYPE_BYTES])
-            index += NUM_TYPE_BYTES
-            self.id = int.from_bytes(
-                data[index: index + NUM_ID_BYTES], byteorder='big')
-            index += NUM_ID_BYTES
-            self.checksum = data[index: index + NUM_CKSM_BYTES]
-            index += NUM_CKSM_BYTES
-            self.length = int.from_bytes(
-                data[index: index + NUM_LEN_BYTES], byteorder='big')
-            index += NUM_CKSM_BYTES
-
-            if len(data) - index >= self.length:
-                self.data = data[index: index + self.length]
-            else:
-                raise PacketError(f'Failed to create packet,'
-                                  f'payload length ({len(data) - index}) did not meet expected length ({self.length}).')
-
         else:
+            self._decode(data, 0)
+
+    # Decodes a packet whose header starts at 'offset' within buf, without copying the payload
+    @classmethod
+    def from_buffer(cls, buf, offset=0, cmode: CommMode = None):
+        packet = cls.__new__(cls)
+        packet.cmode = cmode
+        packet.pool = None
+        packet.future = None
+        packet._decode(buf, offset)
+        return packet
+
+    # Returns a shallow copy of the packet (payload is shared, cached checksum sum is kept). The copy is never pooled, and
+    # has no SendFuture.
+    def copy(self):
+        packet = Packet.__new__(Packet)
+        packet.cmode = self.cmode
+        packet.type = self.type
+        packet.flags = self.flags
+        packet.id = self.id
+        packet.checksum = self.checksum
+        packet.length = self.length
+        packet._data = self._data
+        packet._data_sum = self._data_sum
+        packet.pool = None
+        packet.future = None
+        return packet
+
+    # Returns the packet to the pool it was acquired from. Does nothing for packets that were not pooled.
+    def release(self):
+        if self.pool is not None:
+            self.pool.release(self)
+
+    # Sets fields from the binary header at 'offset' within buf. The payload is kept as a memoryview over buf, so large
+    # payloads (e.g. IMAGE) are not copied. Raises ValueError if the type byte is not a valid MsgType.
+    def _decode(self, buf, offset):
+        if len(buf) - offset < MIN_PACKET_SIZE:
             raise PacketError(f'Failed to create packet, '
                               f'invalid parameters.')
 
+        sync, ptype, id_high, id_low, self.checksum, self.length = HEADER_STRUCT.unpack_from(buf, offset)
+        if sync != SYNC_WORD:
+            raise PacketError(f'Failed to create packet,'
+                              f'invalid sync word: {sync}')
+        try:
+            self.type = MSG_TYPE_LOOKUP[ptype & TYPE_MASK]
+        except KeyError:
+            raise ValueError(f'{ptype & TYPE_MASK} is not a valid MsgType')
+        self.flags = ptype & ~TYPE_MASK
+        self.id = (id_high << 16) | id_low
+
+        start = offset + MIN_PACKET_SIZE
+        if len(buf) - start >= self.length:
+            self.data = memoryview(buf)[start: start + self.length]
+        else:
+            raise PacketError(f'Failed to create packet,'
+                              f'payload length ({len(buf) - start}) did not meet expected length ({self.length}).')
+
     # Returns byte string representing the packet
     def to_binary(self):
-        return SYNC_WORD + \
-            self.type.value + \
-            self.id.to_bytes(length=NUM_ID_BYTES, byteorder='big') + \
-            self.checksum + \
-            self.length.to_bytes(length=NUM_LEN_BYTES, byteorder='big') + \
-            self.data
-
-    # Mutes own checksum field, then returns calculated CRC-16 checksum of packet.
+        return self.__pack_header(self.checksum) + self.data
+
+    # Total number of bytes the packet occupies once encoded
+    def frame_size(self):
+        return MIN_PACKET_SIZE + self.length
+
+    # Compact header (see top of file) for use over links that are already framed and checksummed
+    def compact_header(self):
+        return bytes([self.type.value[0] | self.flags]) + encode_varint(self.id) + encode_varint(self.length)
+
+    # Total number of bytes the packet occupies once encoded with a compact header
+    def compact_frame_size(self):
+        return 1 + varint_size(self.id) + varint_size(self.length) + self.length
+
+    # Decodes a packet with a compact header starting at 'offset' within buf. As the link has already verified the
+    # message, the packet's checksum is computed locally so CommHandler's integrity checks pass.
+    @classmethod
+    def from_compact_buffer(cls, buf, offset=0, cmode: CommMode = None):
+        if offset >= len(buf):
+            raise PacketError(f'Failed to create packet, '
+                              f'invalid parameters.')
+        packet = cls.__new__(cls)
+        packet.cmode = cmode
+        packet.pool = None
+        packet.future = None
+        ptype = buf[offset]
+        try:
+            packet.type = MSG_TYPE_LOOKUP[ptype & TYPE_MASK]
+        except KeyError:
+            raise ValueError(f'{ptype & TYPE_MASK} is not a valid MsgType')
+        packet.flags = ptype & ~TYPE_MASK
+        packet.id, index = decode_varint(buf, offset + 1)
+        packet.length, start = decode_varint(buf, index)
+        if len(buf) - start < packet.length:
+            raise PacketError(f'Failed to create packet,'
+                              f'payload length ({len(buf) - start}) did not meet expected length ({packet.length}).')
+        packet.data = memoryview(buf)[start: start + packet.length]
+        packet.checksum = packet.calc_checksum()
+        return packet
+
+    # Encodes the packet into buf starting at 'offset'. Returns the offset just past the encoded packet.
+    def pack_into(self, buf, offset):
+        HEADER_STRUCT.pack_into(buf, offset, SYNC_WORD, self.type.value[0] | self.flags, self.id >> 16,
+                                self.id & 0xffff, self.checksum, self.length)
+        start = offset + MIN_PACKET_SIZE
+        buf[start: start + self.length] = self.data
+        return start + self.length
+
+    def __pack_header(self, checksum):
+        return HEADER_STRUCT.pack(SYNC_WORD, self.type.value[0] | self.flags, self.id >> 16, self.id & 0xffff,
+                                  checksum, self.length)
+
+    # Payload bytes. Assigning new data invalidates the cached payload checksum sum.
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self._data_sum = None
+
+    # One's complement sum of the payload, cached so ID/type/length changes only need the header re-folded.
+    def payload_sum(self):
+        if self._data_sum is None:
+            self._data_sum = ones_complement_sum(self._data)
+        return self._data_sum
+
+    # One's complement sum of the 12-byte header with a zeroed checksum field.
+    def header_sum(self):
+        return ones_complement_sum(self.__pack_header(bytes(NUM_CKSM_BYTES)))
+
+    # Returns calculated checksum of packet, as if its checksum field were zeroed. Only the header is re-summed, the
+    # payload's partial sum is reused between calls.
     def calc_checksum(self):
-        temp = self.checksum
-        self.checksum = bytes(2)  # Set own, mutable checksum to 0
-        new_checksum = calc_checksum(self.to_binary())
-        self.checksum = temp  # Reset checksum
-        return new_checksum
+        s = carry_around_add(self.header_sum(), self.payload_sum())
+        return int.to_bytes(~s & 0xffff, NUM_CKSM_BYTES, 'big')
+
+
+# Small free-list of preallocated packets, used for control frames (ACKs, handshake responses, heartbeats) that would
+# otherwise be allocated and garbage collected at a high rate under sustained ARQ traffic. deque append/pop are atomic,
+# so a pool can be shared between the application, ingress and egress threads.
+class PacketPool:
+    def __init__(self, size=CONTROL_POOL_SIZE):
+        self.free = deque(maxlen=size)
+        for i in range(size):
+            packet = Packet(MsgType.HEARTBEAT)
+            packet.pool = self
+            self.free.append(packet)
+
+    # Returns a pooled packet re-initialized with the given fields, allocating a new one if the pool is empty
+    def acquire(self, ptype: MsgType, pid=0, data: bytes = b'', cmode: CommMode = None):
+        try:
+            packet = self.free.pop()
+        except IndexError:
+            packet = Packet(ptype)
+            packet.pool = self
+        packet.type = ptype
+        packet.flags = 0
+        packet.id = pid
+        packet.checksum = bytes(NUM_CKSM_BYTES)
+        packet.length = len(data)
+        packet._data = data
+        packet._data_sum = None
+        packet.cmode = cmode
+        packet.future = None
+        return packet
+
+    def release(self, packet: Packet):
+        packet.data = b''  # Drop reference to payload
+        self.free.append(packet)
+
+
+# Encodes a list of packets back-to-back into one contiguous buffer, allocated once. Checksums must already be set
+# when using the standard header.
+def encode_many(packets, header_format=HeaderFormat.STANDARD):
+    if header_format == HeaderFormat.COMPACT:
+        headers = [packet.compact_header() for packet in packets]
+        buf = bytearray(sum(len(header) + packet.length for header, packet in zip(headers, packets)))
+        offset = 0
+        for header, packet in zip(headers, packets):
+            buf[offset: offset + len(header)] = header
+            offset += len(header)
+            buf[offset: offset + packet.length] = packet.data
+            offset += packet.length
+        return buf
+
+    buf = bytearray(sum(packet.frame_size() for packet in packets))
+    offset = 0
+    for packet in packets:
+        offset = packet.pack_into(buf, offset)
+    return buf
+
+
+# Splits packets into consecutive batches whose encoded size (with header_format) is at most max_size bytes. A packet
+# that is larger than max_size on its own is placed in a batch by itself.
+def split_batches(packets, max_size, header_format=HeaderFormat.STANDARD):
+    batches = []
+    batch = []
+    batch_size = 0
+    for packet in packets:
+        size = packet.compact_frame_size() if header_format == HeaderFormat.COMPACT else packet.frame_size()
+        if batch and batch_size + size > max_size:
+            batches.append(batch)
+            batch = []
+            batch_size = 0
+        batch.append(packet)
+        batch_size += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+# Yields every valid packet contained in a complete buffer, e.g. an SBD message or email attachment. Compact headers
+# carry no sync word to resync on, so decoding stops at the first invalid compact packet.
+def decode_stream(buf, cmode: CommMode = None, header_format=HeaderFormat.STANDARD):
+    if header_format == HeaderFormat.COMPACT:
+        offset = 0
+        while offset < len(buf):
+            try:
+                packet = Packet.from_compact_buffer(buf, offset, cmode)
+            except (PacketError, ValueError):
+                return
+            offset += packet.compact_frame_size()
+            yield packet
+        return
+
+    yield from StreamDecoder(cmode).feed(buf)
+
+
+# Number of bytes encode_varint uses for value
+def varint_size(value):
+    return max(1, (value.bit_length() + 6) // 7)
+
+
+def encode_varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+# Returns the varint starting at 'offset' within buf and the offset just past it
+def decode_varint(buf, offset):
+    value = 0
+    shift = 0
+    while offset < len(buf):
+        byte = buf[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+        if shift > 7 * (NUM_ID_BYTES + 1):
+            break
+    raise PacketError(f'Failed to create packet, '
+                      f'invalid varint.')
+
+
+# Incremental decoder for a byte stream that may split packets across reads (e.g. serial). Each call to feed() yields
+# every complete, valid packet available so far and keeps any trailing partial packet for the next call. Garbage and
+# corrupt packets are skipped by jumping to the next SYNC_WORD.
+#
+# Received bytes are appended to a preallocated buffer and decoded in place, consumed bytes are never moved or copied.
+# Payloads are memoryviews over this buffer, so it is never wrapped around or overwritten: once full, it is swapped for
+# a fresh one and only the trailing partial packet (if any) is copied over. The old buffer is freed once every packet
+# decoded from it has been dropped.
+class StreamDecoder:
+    def __init__(self, cmode: CommMode = None, capacity=STREAM_BUFFER_SIZE):
+        self.cmode = cmode
+        self.capacity = capacity
+        self.num_dropped = 0  # Number of sync word candidates rejected (invalid checksum / MsgType)
+        self.reset()
+
+    def reset(self):
+        self.buf = bytearray(self.capacity)
+        self.start = 0  # Index of first unconsumed byte in buf
+        self.end = 0  # Index just past the last received byte in buf
+        self.need = 0  # Index buf must be filled up to before the packet at 'start' can be complete
+
+    def feed(self, data):
+        if self.end + len(data) > len(self.buf):
+            self.__swap_buffer(len(data))
+        self.buf[self.end: self.end + len(data)] = data
+        self.end += len(data)
+        if self.end < self.need:
+            return  # Still waiting on the rest of a packet
+        view = memoryview(self.buf)[:self.end]
+
+        while True:
+            sync_ind = self.buf.find(SYNC_WORD, self.start, self.end)
+            if sync_ind < 0:
+                # Keep only bytes that could be the start of a sync word split across reads
+                self.start = max(self.start, self.end - (NUM_SYNC_BYTES - 1))
+                return
+            self.start = sync_ind
+
+            # Wait for the full header, then the full payload, before decoding
+            self.need = self.start + MIN_PACKET_SIZE
+            if self.end < self.need:
+                return
+            self.need += LENGTH_STRUCT.unpack_from(self.buf, self.start + MIN_PACKET_SIZE - NUM_LEN_BYTES)[0]
+            if self.end < self.need:
+                return
+
+            try:
+                packet = Packet.from_buffer(view, self.start, self.cmode)
+            except ValueError:  # Invalid MsgType was given
+                self.num_dropped += 1
+                self.start += 1  # Force jump to next syncword, which may overlap this one
+                continue
+
+            if packet.checksum == packet.calc_checksum():
+                self.start = self.need
+                yield packet
+            else:
+                self.num_dropped += 1
+                self.start += 1  # Force jump to next syncword, which may overlap this one
+
+    # Replaces buf with a new buffer holding the unconsumed bytes and room for at least 'incoming' more
+    def __swap_buffer(self, incoming):
+        pending = self.end - self.start
+        buf = bytearray(max(self.capacity, 2 * (pending + incoming)))
+        buf[:pending] = self.buf[self.start: self.end]
+        self.buf = buf
+        self.need -= self.start
+        self.start = 0
+        self.end = pending
 
 
 # Global checksum function for any bytes object
@@ -136,13 +472,23 @@ def carry_around_add(a, b):
     return (c & 0xffff) + (c >> 16)
 
 
+# Returns the 16-bit one's complement sum of msg's little-endian words, zero-padding an odd trailing byte. Small frames
+# use a single big-integer reduction (2^16 = 1 mod 0xffff, so the sum of words is the integer mod 0xffff); larger
+# frames are summed in one shot by NumPy. Sums of even-length segments can be combined with carry_around_add.
+def ones_complement_sum(msg):
+    if len(msg) < CKSM_NUMPY_THRESHOLD:
+        total = int.from_bytes(msg, byteorder='little')
+    else:
+        total = int(np.frombuffer(msg, dtype='<u2', count=len(msg) // 2).sum(dtype=np.uint64))
+        if len(msg) % 2:
+            total += msg[-1]
+    if total == 0:
+        return 0
+    return (total % 0xffff) or 0xffff
+
+
 def calc_checksum(msg):
-    msg_padded = msg + (b'\x00' * (len(msg) % NUM_CKSM_BYTES))
-    s = 0
-    for i in range(0, len(msg), 2):
-        w = msg_padded[i] + (msg_padded[i + 1] << 8)
-        s = carry_around_add(s, w)
-    return int.to_bytes(~s & 0xffff, NUM_CKSM_BYTES, 'big')
+    return int.to_bytes(~ones_complement_sum(msg) & 0xffff, NUM_CKSM_BYTES, 'big')
 
 
 # Old CRC-16 checksum function, depreciated.
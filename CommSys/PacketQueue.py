@@ -0,0 +1,65 @@
+from collections import deque
+from threading import Condition
+import time
+
+# PacketQueue.py
+#
+# Last updated: 10/18/2026
+# Thread-safe FIFO of received packets shared between a link handler's reader thread and the CommHandler. Backed by a
+# deque (O(1) at both ends) and a Condition, so readers can block until a packet arrives instead of polling. Listeners
+# (threading.Event objects) are also set whenever packets are added, which lets a single thread wait on several links
+# at once.
+
+
+class PacketQueue:
+    def __init__(self):
+        self.packets = deque()
+        self.cond = Condition()
+        self.listeners = []
+
+    def __len__(self):
+        return len(self.packets)
+
+    # Appends packet and wakes up any waiting readers / listeners
+    def put(self, packet):
+        self.put_many([packet])
+
+    # Appends every packet in packets and wakes up any waiting readers / listeners
+    def put_many(self, packets):
+        if not packets:
+            return
+        with self.cond:
+            self.packets.extend(packets)
+            self.cond.notify(len(packets))
+        for event in self.listeners:
+            event.set()
+
+    # Pops and returns the oldest packet. If the queue is empty, waits up to timeout seconds for one to arrive (forever
+    # if timeout is None). Returns None if no packet arrived in time.
+    def get(self, timeout=0):
+        with self.cond:
+            if not self.packets and timeout != 0:
+                expire = None if timeout is None else time.time() + timeout
+                while not self.packets:
+                    remaining = None if expire is None else expire - time.time()
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+            return self.packets.popleft() if self.packets else None
+
+    # Pops and returns every packet in the queue, without waiting
+    def get_all(self):
+        with self.cond:
+            packets = list(self.packets)
+            self.packets.clear()
+        return packets
+
+    # Registers a threading.Event to be set whenever packets are added
+    def add_listener(self, event):
+        self.listeners.append(event)
+        if self.packets:
+            event.set()
+
+    def clear(self):
+        with self.cond:
+            self.packets.clear()
@@ -1,29 +1,46 @@
 import CommSys.rockBlock as rockBlock
 import logging
 from CommSys.CommMode import CommMode
-from CommSys.Packet import Packet, MsgType, PacketError
-from threading import Lock, Thread
+from CommSys.Packet import Packet, MsgType, decode_stream, encode_many, split_batches, LINK_HEADER_FORMATS
+from CommSys.Fragmenter import LINK_MTU, REASSEMBLY_TIMEOUT
+from CommSys.PacketQueue import PacketQueue
+from CommSys.Link import Link, LatencyClass, register_link
+from threading import Thread
 import time
 
 # RockBlockHandler.py
 #
-# Last updated: 04/26/2022 | Primary Contact: Michael Fuhrer, mfuhrer@vt.edu
-# Coverts functions found in 3rd party API, rockBlock.py, into a format the matches our 'abstract' handler format,
-# i.e. has callable write_packet and read_packet functions. Uses a threading to continously check the RockBLOCK for
-# any new packets.
+# Last updated: 10/18/2026 | Primary Contact: Michael Fuhrer, mfuhrer@vt.edu
+# Coverts functions found in 3rd party API, rockBlock.py, into the Link interface (see Link.py), i.e. has callable
+# write_packet and read_packet functions. Uses a threading to continously check the RockBLOCK for any new packets.
 #
 # TODO List:
 # - Validate implementation
 # - Automatically resend packet to RockBLOCK if sendMessage fails (should be non-blocking)
 
 SER_DEVICE = "dev/ttyUSB0"
+SAT_TX_TIMEOUT = 60  # Initial time (in seconds) before an unacknowledged packet is resent over satellite
+SAT_RTO = (SAT_TX_TIMEOUT, 10, 600)  # Initial, minimum and maximum retransmission timeout of satellite links
+# Smallest congestion window of satellite links. Every satellite packet is a whole SBD message, so a congested satellite
+# link has to shed real load: down to a quarter of the initial window.
+SAT_MIN_WINDOW = 2
 
 logger = logging.getLogger(__name__)
 
 
-class RockBlockHandler(Thread):
+class RockBlockHandler(Thread, Link):
+    cmode = CommMode.SATELLITE
+    mtu = LINK_MTU[CommMode.SATELLITE]
+    header_format = LINK_HEADER_FORMATS[CommMode.SATELLITE]
+    reliable = True
+    cost_per_byte = 1 / 50
+    latency_class = LatencyClass.HIGH
+    rto = SAT_RTO
+    min_window = SAT_MIN_WINDOW
+    reassembly_timeout = REASSEMBLY_TIMEOUT[CommMode.SATELLITE]
+
     def __init__(self):
-        self.reliable = True
+        super(RockBlockHandler, self).__init__(daemon=True)
         self.proto = ISBDPacketProtocol()
         self.running = False
 
@@ -36,8 +53,20 @@ class RockBlockHandler(Thread):
     def write_packet(self, packet: Packet):
         self.proto.write_packet(packet)
 
-    def read_packet(self):
-        return self.proto.read_packet()
+    def write_packets(self, packets):
+        self.proto.write_packets(packets)
+
+    # Pops the oldest received packet, waiting up to timeout seconds for one (forever if None). Returns None if no
+    # packet arrived in time.
+    def read_packet(self, timeout=0):
+        return self.proto.read_packet(timeout)
+
+    def read_packets(self):
+        return self.proto.received_packets.get_all()
+
+    # Registers a threading.Event to be set whenever a packet is received
+    def add_rx_listener(self, event):
+        self.proto.received_packets.add_listener(event)
 
     def close(self):
         self.stop()
@@ -47,12 +76,14 @@ class RockBlockHandler(Thread):
         self.join()
 
 
+register_link('rockblock', RockBlockHandler)
+
+
 # Using a special protocol to handle certain asynchronous events during an exchange with RockBLOCK device.
 class ISBDPacketProtocol(rockBlock.rockBlockProtocol):
     def __init__(self):
         # does NOT represent the time it takes for landbase to send an ACK
-        self.received_packets = []
-        self.received_packets_l = Lock()
+        self.received_packets = PacketQueue()
         self.rb = rockBlock.rockBlock(SER_DEVICE, self)
 
     def __del__(self):
@@ -61,36 +92,33 @@ class ISBDPacketProtocol(rockBlock.rockBlockProtocol):
     def message_check(self):
         self.rb.messageCheck()
 
-    # Uses data found in asynchronous rx event to create packet.
+    # Uses data found in asynchronous rx event to create packet(s). An SBD message may hold several packets.
     def rockBlockRxReceived(self, mtmsn, data):
-        try:
-            packet = Packet(data=self.read_buf, cmode=CommMode.SATELLITE)
-            if packet.checksum == packet.calc_checksum():
-                # Valid packet was created
-                logger.debug(f"RockBlockHandler found valid packet (ID: {packet.id} Type: {packet.type}).")
-                with self.received_packets_l:
-                    self.received_packets.append(packet)
-            else:
-                logger.debug(f"RockBlockHandler dropped packet (ID: {packet.id}) due to invalid checksum. "
-                             f"Expected: {packet.checksum}, Actual: {packet.calc_checksum()}")
-
-        except PacketError as e:
-            pass
-
-        except ValueError:  # Invalid MsgType was given
-            logger.debug(f"RockBlockHandler dropped packet due to invalid MsgType")
+        packets = list(decode_stream(data, cmode=CommMode.SATELLITE,
+                                     header_format=LINK_HEADER_FORMATS[CommMode.SATELLITE]))
+        if packets:
+            logger.debug(f"RockBlockHandler found {len(packets)} valid packet(s) in message (MTMSN: {mtmsn}).")
+            self.received_packets.put_many(packets)
+        else:
+            logger.debug(f"RockBlockHandler found no valid packets in message (MTMSN: {mtmsn}).")
 
     def write_packet(self, packet: Packet):
-        if self.rb.sendMessage(packet.to_binary()):
-            logger.debug(f"Packet (Type {packet.type}) successfully accepted!")
-        else:
-            logger.debug(f"Packet (Type {packet.type}) failed to send.")
+        self.write_packets([packet])
+
+    # Sends packets in as few SBD messages as possible, each message holding at most LINK_MTU bytes
+    def write_packets(self, packets):
+        header_format = LINK_HEADER_FORMATS[CommMode.SATELLITE]
+        for batch in split_batches(packets, LINK_MTU[CommMode.SATELLITE], header_format):
+            msg = encode_many(batch, header_format)
+            saved = sum(packet.frame_size() for packet in batch) - len(msg)
+            if self.rb.sendMessage(msg):
+                logger.debug(f"{len(batch)} packet(s) successfully accepted! "
+                             f"({len(msg)} B message, {saved} B saved by header format)")
+            else:
+                logger.debug(f"{len(batch)} packet(s) failed to send.")
 
-    def read_packet(self):
-        if len(self.received_packets) > 0:
-            with self.received_packets_l:
-                return self.received_packets.pop(0)
-        return None
+    def read_packet(self, timeout=0):
+        return self.received_packets.get(timeout)
 
 
 if __name__ == "__main__":
@@ -98,7 +126,5 @@ if __name__ == "__main__":
     packet = Packet(MsgType.TEXT, data=b'Hello world!!!')
     rb.start()
     rb.write_packet(packet)
-    recv = None
-    while recv is None:
-        recv = rb.read_packet()
+    recv = rb.read_packet(timeout=None)
     print(f'Received packet! Type: {packet.type} Length: {packet.length} Data: {packet.data}')
@@ -0,0 +1,53 @@
+# RttEstimator.py
+#
+# Last updated: 10/18/2026
+# Round-trip time estimation and retransmission timeout (RTO) calculation for a single link, following Jacobson/Karels
+# (RFC 6298): a smoothed RTT and RTT variance are updated from every valid sample, and the RTO is doubled each time a
+# retransmission timer expires until a new sample arrives. Samples must follow Karn's rule, i.e. only be taken from
+# packets that were never retransmitted, as an ACK for a retransmitted packet can't be matched to a transmission. The
+# backed-off RTO is also kept until such a sample arrives, so a link slower than the RTO estimate keeps its longer
+# timeout instead of timing out again at the short one after every ambiguous ACK.
+
+RTT_ALPHA = 1 / 8  # Gain of the smoothed RTT
+RTT_BETA = 1 / 4  # Gain of the RTT variance
+RTT_K = 4  # Number of RTT variances added to the smoothed RTT
+CLOCK_GRANULARITY = 0.010  # Seconds, lower bound on the variance term
+
+
+class RttEstimator:
+    def __init__(self, initial_rto, min_rto, max_rto):
+        self.initial_rto = initial_rto
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.reset()
+
+    def reset(self):
+        self.srtt = None  # Smoothed RTT, None until the first sample
+        self.rttvar = None
+        self.base_rto = self.initial_rto  # RTO calculated from the estimate, before any backoff
+        self.rto = self.initial_rto
+        self.num_backoffs = 0  # Timeouts since the last valid sample
+
+    # Updates the estimate with a new RTT sample (in seconds) and recalculates the RTO
+    def sample(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - RTT_BETA) * self.rttvar + RTT_BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - RTT_ALPHA) * self.srtt + RTT_ALPHA * rtt
+        self.base_rto = self.__clamp(self.srtt + max(CLOCK_GRANULARITY, RTT_K * self.rttvar))
+        # Only a valid sample undoes the backoff
+        self.num_backoffs = 0
+        self.rto = self.base_rto
+
+    # Doubles the RTO after a retransmission timer expired
+    def backoff(self):
+        self.num_backoffs += 1
+        self.rto = self.__clamp(self.rto * 2)
+
+    def metrics(self):
+        return {'srtt': self.srtt, 'rttvar': self.rttvar, 'rto': self.rto, 'backoffs': self.num_backoffs}
+
+    def __clamp(self, rto):
+        return min(self.max_rto, max(self.min_rto, rto))
@@ -0,0 +1,62 @@
+from concurrent.futures import Future, wait
+from threading import Lock
+
+# SendFuture.py
+#
+# Last updated: 10/18/2026
+# Handle returned by CommHandler.send_packet. It resolves once the packet has been delivered: acknowledged by the other
+# party for packets sent using RDT, or handed to the link for the others (e.g. over satellite, or IMAGE over radio). A
+# packet split into fragments resolves once every fragment has. It fails with a SendError if the packet is discarded
+# first, e.g. dropped by a QoS policy or not yet acknowledged when the CommHandler is rebooted or stopped.
+#
+# SendFuture is a concurrent.futures.Future, so result(timeout), exception(timeout), add_done_callback() and
+# asyncio.wrap_future() work as usual. Callbacks run on the CommHandler thread that resolves the future (the ingress
+# thread for ACKs), so they should return quickly.
+
+
+class SendError(Exception):
+    pass
+
+
+class SendFuture(Future):
+    # num_packets is the number of packets (e.g. fragments) that must be delivered before the future resolves
+    def __init__(self, num_packets=1):
+        super().__init__()
+        self.num_pending = num_packets
+        self.resolved = False
+        self.resolve_lock = Lock()
+        # Queued packets can't be recalled, so the future can't be cancelled
+        self.set_running_or_notify_cancel()
+
+    # Waits up to timeout seconds (forever if None) for the future to resolve or fail. Returns True if it is done.
+    def wait(self, timeout=None):
+        done, _ = wait([self], timeout)
+        return bool(done)
+
+    # Returns True if the packet has been delivered
+    def delivered(self):
+        return self.done() and self.exception() is None
+
+    # Marks one of the packets as delivered, resolving the future once all of them are
+    def packet_done(self):
+        with self.resolve_lock:
+            self.num_pending -= 1
+            if self.num_pending > 0 or self.resolved:
+                return
+            self.resolved = True
+        self.set_result(None)
+
+    # Fails the future with error, unless it is already done
+    def fail(self, error: Exception):
+        with self.resolve_lock:
+            if self.resolved:
+                return
+            self.resolved = True
+        self.set_exception(error)
+
+
+# Fails the futures of packets that won't be delivered with a SendError. Packets without a future are skipped.
+def fail_packets(packets, reason):
+    for packet in packets:
+        if packet.future is not None:
+            packet.future.fail(SendError(reason))
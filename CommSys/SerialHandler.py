@@ -1,29 +1,34 @@
 import serial
 from serial.threaded import ReaderThread
 import logging
-from threading import Lock
 from CommSys.CommMode import CommMode
-from CommSys.Packet import Packet, SYNC_WORD, MIN_PACKET_SIZE, PacketError
+from CommSys.Packet import Packet, StreamDecoder, encode_many
+from CommSys.PacketQueue import PacketQueue
+from CommSys.Link import Link, register_link
 
 # SerialHandler.py, previously RadioHandler.py
 #
-# Last updated: 04/18/2022 | Primary Contact: Michael Fuhrer, mfuhrer@vt.edu
+# Last updated: 10/18/2026 | Primary Contact: Michael Fuhrer, mfuhrer@vt.edu
 # Uses serial.threaded library to implement an asynchronous handler of incoming bytes from a serial device.
 # See https://pyserial.readthedocs.io/en/latest/pyserial_api.html#module-serial.threaded for details.
 
 SER_DEVICE = "/dev/ttyAMA0"
 BAUD = 115200
 RTSCTS = False
-RADIO_TX_TIMEOUT = 2.5
+RADIO_TX_TIMEOUT = 2.5  # Initial time (in seconds) before an unacknowledged packet is resent over radio
 
 logger = logging.getLogger(__name__)
 
 
-class SerialHandler(ReaderThread):
+class SerialHandler(ReaderThread, Link):
+    cmode = CommMode.RADIO
+    rto = (RADIO_TX_TIMEOUT, 0.25, 5)
+
     def __init__(self):
-        self.reliable = False
         self.ser = serial.Serial(SER_DEVICE, baudrate=BAUD)
-        super(SerialHandler, self).__init__(self.ser, SerialPacketProtocol)
+        # Owned here rather than by the protocol, which is only created once the reader thread starts
+        self.received_packets = PacketQueue()
+        super(SerialHandler, self).__init__(self.ser, lambda: SerialPacketProtocol(self.received_packets))
 
     def start(self):
         if not self.is_alive():
@@ -37,17 +42,31 @@ class SerialHandler(ReaderThread):
         if self.is_alive():
             return self.protocol.write_packet(packet)
 
-    def read_packet(self):
+    def write_packets(self, packets):
         if self.is_alive():
-            return self.protocol.read_packet()
+            return self.protocol.write_packets(packets)
+
+    # Pops the oldest received packet, waiting up to timeout seconds for one (forever if None). Returns None if no
+    # packet arrived in time.
+    def read_packet(self, timeout=0):
+        return self.received_packets.get(timeout)
+
+    def read_packets(self):
+        return self.received_packets.get_all()
+
+    # Registers a threading.Event to be set whenever a packet is received
+    def add_rx_listener(self, event):
+        self.received_packets.add_listener(event)
+
+
+register_link('serial', SerialHandler)
 
 
 # Asynchronous event handler protocol
 class SerialPacketProtocol(serial.threaded.Protocol):
-    def __init__(self):
-        self.read_buf = b''
-        self.received_packets = []
-        self.received_packets_l = Lock()
+    def __init__(self, received_packets: PacketQueue = None):
+        self.decoder = StreamDecoder(CommMode.RADIO)
+        self.received_packets = PacketQueue() if received_packets is None else received_packets
         self.transport = None
         self.reliable_medium = False
 
@@ -56,47 +75,27 @@ class SerialPacketProtocol(serial.threaded.Protocol):
 
     def connection_lost(self, exc):
         self.transport = None
-        self.read_buf = b''
+        self.decoder.reset()
         super(SerialPacketProtocol, self).connection_lost(exc)
 
-    # Attempts to create a packet whenever new data is received. If a packet can be made, it is created, and the bytes
-    # used to make it are removed from read_buf. If an erronous packet was made, jump to the next SYNC WORD in read_buf
-    # (if one exists).
+    # Decodes every complete packet found whenever new data is received. Any trailing partial packet is kept by the
+    # decoder until the rest of it arrives; corrupt packets are skipped by jumping to the next SYNC WORD.
     def data_received(self, data):
-        self.read_buf += data
-
-        sync_ind = self.read_buf.find(SYNC_WORD)
-        if sync_ind >= 0:
-            # Sync word exists in read buffer, head to it
-            if sync_ind > 0:
-                logger.debug("SerialHandler jumping to found sync word")
-                self.read_buf = self.read_buf[sync_ind:]
-
-        # Try to make a packet from read_buf
-        try:
-            packet = Packet(data=self.read_buf, cmode=CommMode.RADIO)
-            if packet.checksum == packet.calc_checksum():
-                # Valid packet was created
-                logger.debug(f"SerialHandler found valid packet (ID: {packet.id} Type: {packet.type}).")
-                with self.received_packets_l:
-                    self.received_packets.append(packet)
-                self.read_buf = self.read_buf[(packet.length + MIN_PACKET_SIZE):]
-            else:
-                logger.debug(f"SerialHandler dropped packet (ID: {packet.id}) due to invalid checksum. "
-                             f"Expected: {packet.checksum}, Actual: {packet.calc_checksum()}")
-                logger.debug(f"Bad packet: {packet.to_binary()[0:32]}")
-                self.read_buf = self.read_buf[len(SYNC_WORD):]  # Force jump to next syncword
-        except PacketError as e:
-            pass
-        except ValueError:  # Invalid MsgType was given
-            logger.debug(f"SerialHandler dropped packet due to invalid MsgType")
-            self.read_buf = self.read_buf[len(SYNC_WORD):]  # Force jump to next syncword
+        num_dropped = self.decoder.num_dropped
+        packets = list(self.decoder.feed(data))
+        if self.decoder.num_dropped != num_dropped:
+            logger.debug(f"SerialHandler dropped {self.decoder.num_dropped - num_dropped} packet(s) due to invalid "
+                         f"checksum or MsgType")
+        if packets:
+            logger.debug(f"SerialHandler found {len(packets)} valid packet(s).")
+            self.received_packets.put_many(packets)
 
     def write_packet(self, packet: Packet):
         self.transport.write(packet.to_binary())
 
-    def read_packet(self):
-        if len(self.received_packets) > 0:
-            with self.received_packets_l:
-                return self.received_packets.pop(0)
-        return None
+    # Writes all packets with a single serial write
+    def write_packets(self, packets):
+        self.transport.write(encode_many(packets))
+
+    def read_packet(self, timeout=0):
+        return self.received_packets.get(timeout)
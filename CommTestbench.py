@@ -13,6 +13,7 @@ logging.basicConfig(filename='testbench.log',
 # General test bench parameters
 window_size = 8
 tx_timeout = 4
+send_timeout = 60  # Max time (in seconds) to wait for a packet to be delivered before moving on
 
 comm_handler: CommHandler
 
@@ -73,7 +74,7 @@ def packet_loss_sender():
     global comm_handler
     print("----- / Packet Loss Test: Sender / -----")
     handshake_packet = Packet(MsgType.HANDSHAKE)
-    test_packet = Packet(MsgType.IMAGE, data=b'A' * packet_size)
+    test_data = b'A' * packet_size
     stop_packet = Packet(MsgType.TEXT, data=b'STOP')
     comm_handler = CommHandler(tx_timeout=tx_timeout, window_size=window_size, reliable_img=packet_loss_reliable)
 
@@ -90,17 +91,17 @@ def packet_loss_sender():
     printProgressBar(0, num_packets, printEnd='')
 
     # Send image packets
+    futures = []
     for i in range(num_packets):
-        test_packet.pid = i
-        test_packet.checksum = test_packet.calc_checksum()
-        comm_handler.send_packet(test_packet)
+        # A new packet each time, its ID and checksum are set by the CommHandler when it is sent
+        futures.append(comm_handler.send_packet(Packet(MsgType.IMAGE, data=test_data)))
         printProgressBar(i + 1, num_packets, printEnd='')
 
     # Send stop packet
-    comm_handler.send_packet(stop_packet)
+    futures.append(comm_handler.send_packet(stop_packet))
 
-    while comm_handler.tx_base != comm_handler.tx_next_seq_num:
-        pass # wait until sender is done
+    for future in futures:
+        future.wait(send_timeout)  # wait until sender is done
 
     print('Test complete!')
     print("Check receiver's terminal for results.")
@@ -194,11 +195,11 @@ def throughput_sender():
         print("Starting in debug mode...")
         comm_handler.start(CommMode.DEBUG)
 
-    for i in range(num_packets):
-        comm_handler.send_packet(test_packet)
+    futures = [comm_handler.send_packet(test_packet) for i in range(num_packets)]
 
-    while comm_handler.tx_base < num_packets+1:
-        printProgressBar(comm_handler.tx_base, num_packets+1, printEnd='')
+    for i, future in enumerate(futures):
+        future.wait(send_timeout)
+        printProgressBar(i + 1, num_packets, printEnd='')
 
     print(f'All packets have been sent - check receiver for results.')
 
@@ -281,12 +282,13 @@ def latency_sender():
         comm_handler.start(CommMode.DEBUG)
 
     rtt_measurements = []
+    futures = []
 
     for i in range(num_packets):
         # Send packet and start timer
         print(f'Packet #{i} ', end='')
         start_time = time.time()
-        comm_handler.send_packet(test_packet)
+        futures.append(comm_handler.send_packet(test_packet))
 
         # Wait for echo
         while not comm_handler.recv_flag():
@@ -302,8 +304,8 @@ def latency_sender():
     total_time = sum(rtt_measurements)
     avg_RTT = total_time / num_packets
 
-    while comm_handler.tx_base != comm_handler.tx_next_seq_num:
-        pass # wait until sender is done
+    for future in futures:
+        future.wait(send_timeout)  # wait until sender is done
 
     print(f'Test complete!')
     print(f'Total time: {int(total_time / 60)} min {int(total_time % 60)} sec')
@@ -327,15 +329,16 @@ def latency_receiver():
 
     # Wait until all packets have been received
     recv_packets = 0
+    futures = []
     while recv_packets != num_packets:
         if comm_handler.recv_flag():
             recv_packets += 1
             echo_request = comm_handler.recv_packet()
             print(f"Packet #{recv_packets} received. Echoing...")
-            comm_handler.send_packet(echo_request)
+            futures.append(comm_handler.send_packet(echo_request))
 
-    while comm_handler.tx_base < num_packets+1:
-        pass # wait for echoes to be received
+    for future in futures:
+        future.wait(send_timeout)  # wait for echoes to be received
 
     print('Test complete!')
     print("Check sender's terminal for results")
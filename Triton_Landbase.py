@@ -5,7 +5,8 @@ from SensorLib.FPS import FPS
 import logging
 import json
 import time
-from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Lock
 from wsgiref.simple_server import *
 from ws4py.server.wsgirefserver import WSGIServer, WebSocketWSGIRequestHandler
 from ws4py.server.wsgiutils import WebSocketWSGIApplication
@@ -17,7 +18,7 @@ from WebGUI.WebGUI_Flask import app
 
 # Triton_Landbase.py
 #
-# Last updated: 04/26/2022
+# Last updated: 10/18/2026
 # Main application-level script for the landbase. Combines WebGUI with CommSys so commands can be
 # sent from the user to the robot and the webGUI can display current data from robot.
 #
@@ -27,6 +28,7 @@ from WebGUI.WebGUI_Flask import app
 
 HEARTBEAT_TIMER = 15
 LOST_TIMER = 60
+HEARTBEAT_CHECK_INTERVAL = 0.5  # Time (in seconds) between checks of the heartbeat timers
 
 state_dict = {
     0: "Null",
@@ -39,9 +41,15 @@ state_dict = {
 
 fps = FPS()
 comm_handler = CommHandler(landbase=True)
+# Runs packet handlers in the order packets are received, off the CommHandler's ingress thread. Handlers broadcast over
+# the websockets and may reboot the CommHandler, neither of which may happen on the ingress thread.
+packet_executor = ThreadPoolExecutor(max_workers=1)
 app.config['commHandler'] = comm_handler
 heartbeat_ts = 0
 heartbeat_sent = False
+# Held while the CommHandler reboots. Reboots may start from the main loop or a packet handler, and nothing is sent until
+# the connection is back.
+reconnect_lock = Lock()
 
 logging.basicConfig(filename='landbase.log',
                     level=logging.DEBUG,
@@ -66,6 +74,7 @@ websocketCamera.initialize_websockets_manager()
 
 def main():
     logger.info("Landbase starting...")
+    subscribe_handlers()
     print("Connecting to robot...")
     comm_handler.start(mode=CommMode.HANDSHAKE)
     print("Connected!")
@@ -81,18 +90,17 @@ def main():
     fps.start()
 
     try:
+        # Received packets are handled by the subscribed handlers
         while True:
             req_heartbeat()
-            # Read all packets that are received
-            if comm_handler.recv_flag():
-                packet = comm_handler.recv_packet()
-                digest_packet(packet)
+            time.sleep(HEARTBEAT_CHECK_INTERVAL)
 
     except KeyboardInterrupt:
         pass
     finally:
         logger.info("Landbase stopping...")
         comm_handler.stop()
+        packet_executor.shutdown()
         fps.stop()
 
         logger.info("[INFO] elasped time: {:.2f}".format(fps.elapsed()))
@@ -101,10 +109,12 @@ def main():
 
 def req_heartbeat():
     global heartbeat_sent, heartbeat_ts
+    if reconnect_lock.locked():
+        return
     t = time.time()
     if t - HEARTBEAT_TIMER > heartbeat_ts and not heartbeat_sent:
         print("Sending heartbeat request...")
-        heartbeat_req = Packet(MsgType.HEARTBEAT_REQ)
+        heartbeat_req = comm_handler.control_packet(MsgType.HEARTBEAT_REQ)
         comm_handler.send_packet(heartbeat_req)
         heartbeat_ts = t
         heartbeat_sent = True
@@ -118,54 +128,75 @@ def req_heartbeat():
 
 
 def restart_commhandler():
-    print("Reconnecting to robot...")
-    comm_handler.reboot(CommMode.HANDSHAKE)
-    print("Connected!")
-    webgui_msg("Connected to robot!")
+    # Already reconnecting
+    if not reconnect_lock.acquire(blocking=False):
+        return
+    try:
+        print("Reconnecting to robot...")
+        comm_handler.reboot(CommMode.HANDSHAKE)
+        print("Connected!")
+        webgui_msg("Connected to robot!")
+    finally:
+        reconnect_lock.release()
 
 
-def digest_packet(packet: Packet):
+# Registers the handler of each MsgType received from the robot
+def subscribe_handlers():
+    for ptype in (MsgType.TEXT, MsgType.INFO, MsgType.ERROR):
+        comm_handler.subscribe(ptype, on_text, packet_executor)
+    comm_handler.subscribe(MsgType.HEARTBEAT, on_heartbeat, packet_executor)
+    comm_handler.subscribe(MsgType.IMAGE, on_image, packet_executor)
+    comm_handler.subscribe(MsgType.HANDSHAKE, on_handshake, packet_executor)
+    comm_handler.subscribe(None, on_other, packet_executor)
+
+
+def on_text(packet: Packet):
+    print(str(packet.data, 'utf-8'))
+    webgui_msg(str(packet.data, 'utf-8'))
+
+
+def on_heartbeat(packet: Packet):
     global heartbeat_sent
-    if packet is None:
-        return
-    elif packet.type == MsgType.TEXT or packet.type == MsgType.INFO or packet.type == MsgType.ERROR:
-        print(packet.data.decode('utf-8'))
-        webgui_msg(packet.data.decode('utf-8'))
-    elif packet.type == MsgType.HEARTBEAT:
-        # Get all of the information from the heartbeat and send to landbase
-        heartbeat_sent = False
-        latency = time.time() - heartbeat_ts
-
-        state = state_dict[packet.data[0]]
-        webgui_state(state)
-        lat, long, compass, voltage = struct.unpack('4f', packet.data[1:17])
-        webgui_gps(lat, long, compass)
-        webgui_voltage(voltage)
-
-        heartbeat_txt = f'Heartbeat from robot received. Latency: %.2f.' % latency
-        if len(packet.data) > 17:
-            heartbeat_txt += f" Msg: {packet.data[17:].decode('utf-8')}"
-
-        print(heartbeat_txt)
-        webgui_msg(heartbeat_txt)
-
-        if state == "Low Power Mode":
-            logger.info("Low Power Heartbeat received")
-            heartbeat_sent = False
-            time.sleep(0.5)
-            # Robot is entering low power, wait for it to restart communications
-            restart_commhandler()
-
-    elif packet.type == MsgType.IMAGE:
-        # Broadcast h264 encoded image
-        print(f'Received image packet. Length: {packet.length}')
-        websocketCamera.manager.broadcast(packet.data, binary=True)
-    elif packet.type == MsgType.HANDSHAKE:
-        print(f'New connection with robot established.')
-        webgui_msg("New connection with robot established.")
+    # Get all of the information from the heartbeat and send to landbase
+    heartbeat_sent = False
+    latency = time.time() - heartbeat_ts
+
+    state = state_dict[packet.data[0]]
+    webgui_state(state)
+    lat, long, compass, voltage = struct.unpack('4f', packet.data[1:17])
+    webgui_gps(lat, long, compass)
+    webgui_voltage(voltage)
+
+    heartbeat_txt = f'Heartbeat from robot received. Latency: %.2f.' % latency
+    if len(packet.data) > 17:
+        heartbeat_txt += f" Msg: {str(packet.data[17:], 'utf-8')}"
+
+    print(heartbeat_txt)
+    webgui_msg(heartbeat_txt)
+
+    if state == "Low Power Mode":
+        logger.info("Low Power Heartbeat received")
         heartbeat_sent = False
-    else:
-        print(f'Received packet (ID: {packet.id} of type {packet.type})')
+        time.sleep(0.5)
+        # Robot is entering low power, wait for it to restart communications
+        restart_commhandler()
+
+
+def on_image(packet: Packet):
+    # Broadcast h264 encoded image. Payload is a view over the radio's receive buffer, ws4py needs it as bytes.
+    print(f'Received image packet. Length: {packet.length}')
+    websocketCamera.manager.broadcast(bytes(packet.data), binary=True)
+
+
+def on_handshake(packet: Packet):
+    global heartbeat_sent
+    print(f'New connection with robot established.')
+    webgui_msg("New connection with robot established.")
+    heartbeat_sent = False
+
+
+def on_other(packet: Packet):
+    print(f'Received packet (ID: {packet.id} of type {packet.type})')
 
 
 # Send message to webGUI
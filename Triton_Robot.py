@@ -12,11 +12,12 @@ import ME_Integration.escController as esc
 from ME_Integration.SleepyPi import SleepyPi
 from systemd.journal import JournaldLogHandler
 import time
+from concurrent.futures import ThreadPoolExecutor
 from SensorLib.gpsNavi import BerryGPS
 
 # Triton_Robot.py
 #
-# Last updated: 04/18/2022 | Primary Contact: Michael Fuhrer, mfuhrer@vt.edu
+# Last updated: 10/18/2026 | Primary Contact: Michael Fuhrer, mfuhrer@vt.edu
 # Main application-level script for the ocean-wave power robot. Combines Comm Sys. with Sensor Lib. and ME Integration
 # to allow a remote user to obtain sensor data and control the robot live.
 
@@ -54,6 +55,8 @@ def shutdown_notify():
 
 
 comm_handler = CommHandler(landbase=False)
+# Runs packet handlers in the order packets are received, off the CommHandler's ingress thread
+packet_executor = ThreadPoolExecutor(max_workers=1)
 cam = picamera.PiCamera(resolution='320x240', framerate=2)
 cam_handler = CameraHandler(comm_handler, cam)
 arov = AROVHandler()
@@ -72,6 +75,7 @@ def main():
     g_berrygps = BerryGPS()
     logger.info("BerryGPS started!")
 
+    subscribe_handlers()
     logger.info("Connecting to landbase...")
     comm_handler.start(CommMode.HANDSHAKE)
     state = RobotState.IDLE
@@ -79,8 +83,8 @@ def main():
     heartbeat_ts = time.time()
 
     try:
+        # Received packets are handled by the subscribed handlers
         while True:
-            digest_packet(comm_handler.recv_packet())
             check_motors()
             sleepy.check_shutdown()
             from_arov = arov.recvfrom()
@@ -97,71 +101,85 @@ def main():
     finally:
         logging.info("Robot stopping...")
         comm_handler.stop()
+        packet_executor.shutdown()
         cam_handler.stop()
 
 
-# Interpret packet data based on message type
-def digest_packet(packet: Packet):
-    global state, motor_ts, motor_on, heartbeat_ts
-    if packet is None:
-        return
+# Registers the handler of each MsgType received from the landbase
+def subscribe_handlers():
+    comm_handler.subscribe(MsgType.TEXT, on_text, packet_executor)
+    comm_handler.subscribe(MsgType.HEARTBEAT_REQ, on_heartbeat_req, packet_executor)
+    comm_handler.subscribe(MsgType.MTR_CMD, on_motor_cmd, packet_executor)
+    comm_handler.subscribe(MsgType.CTRL_REQ, on_ctrl_req, packet_executor)
+    comm_handler.subscribe(MsgType.GPS_CMD, on_gps_cmd, packet_executor)
+    comm_handler.subscribe(None, on_other, packet_executor)
 
-    elif packet.type == MsgType.TEXT:
-        # Print packet data in log
-        logger.info(f'Received text message: {packet.data.decode("utf-8")}')
 
-    elif packet.type == MsgType.HEARTBEAT_REQ:
-        # Send heartbeat back to landbase
-        logger.info(f'Received heartbeat request')
-        heartbeat_ts = time.time()
-        send_heartbeat()
-
-    elif packet.type == MsgType.MTR_CMD:
-        # Control motors according to command
-        left, right = struct.unpack('2f', packet.data[0:8])
-        logger.info(f'Received motor command: LEFT={str(left)} RIGHT={str(right)}')
-        if state == RobotState.LIVE_CONTROL:
-            motor_on = True
-            motor_ts = time.time()
-            esc.setSpeed(esc.ESC_LEFT, left)
-            esc.setSpeed(esc.ESC_RIGHT, right)
-        elif state == RobotState.AUTO_CONTROL:
-            state = RobotState.LIVE_CONTROL
+def on_text(packet: Packet):
+    # Print packet data in log
+    logger.info(f'Received text message: {str(packet.data, "utf-8")}')
+
+
+def on_heartbeat_req(packet: Packet):
+    global heartbeat_ts
+    # Send heartbeat back to landbase
+    logger.info(f'Received heartbeat request')
+    heartbeat_ts = time.time()
+    send_heartbeat()
+
+
+def on_motor_cmd(packet: Packet):
+    global state, motor_ts, motor_on
+    # Control motors according to command
+    left, right = struct.unpack('2f', packet.data[0:8])
+    logger.info(f'Received motor command: LEFT={str(left)} RIGHT={str(right)}')
+    if state == RobotState.LIVE_CONTROL:
+        motor_on = True
+        motor_ts = time.time()
+        esc.setSpeed(esc.ESC_LEFT, left)
+        esc.setSpeed(esc.ESC_RIGHT, right)
+    elif state == RobotState.AUTO_CONTROL:
+        state = RobotState.LIVE_CONTROL
+        logger.info("Stopping autonomous navigation")
+        info_packet = Packet(MsgType.INFO, data=b'Stopping autonomous navigation.')
+        comm_handler.send_packet(info_packet)
+    else:
+        logger.warning(f"Live control hasn't been enable yet!")
+
+
+def on_ctrl_req(packet: Packet):
+    global state
+    # Enable / disable live control and camera feed
+    enable = (packet.data == b'\x01')
+    if enable and (state != RobotState.LIVE_CONTROL):
+        if state == RobotState.AUTO_CONTROL:
             logger.info("Stopping autonomous navigation")
             info_packet = Packet(MsgType.INFO, data=b'Stopping autonomous navigation.')
             comm_handler.send_packet(info_packet)
-        else:
-            logger.warning(f"Live control hasn't been enable yet!")
-
-    elif packet.type == MsgType.CTRL_REQ:
-        # Enable / disable live control and camera feed
-        enable = (packet.data == b'\x01')
-        if enable and (state != RobotState.LIVE_CONTROL):
-            if state == RobotState.AUTO_CONTROL:
-                logger.info("Stopping autonomous navigation")
-                info_packet = Packet(MsgType.INFO, data=b'Stopping autonomous navigation.')
-                comm_handler.send_packet(info_packet)
-            state = RobotState.LIVE_CONTROL
-            logger.info("Starting live control.")
-            cam_handler.start()
-        elif not enable and state == RobotState.LIVE_CONTROL:
-            state = RobotState.IDLE
-            logger.info("Stopping live control.")
-            cam_handler.stop()
-
-    elif packet.type == MsgType.GPS_CMD:
-        # Set state to autonomous control TODO use autonomous navigation script
-        logger.info("Received new GPS_coordinate.")
-        info = b'GPS coordinates received.'
-        if state != RobotState.AUTO_CONTROL:
-            state = RobotState.AUTO_CONTROL
-            logger.info("Starting autonomous navigation")
-            info += b' Starting autonomous navigation.'
-        info_packet = Packet(MsgType.INFO, data=info)
-        comm_handler.send_packet(info_packet)
+        state = RobotState.LIVE_CONTROL
+        logger.info("Starting live control.")
+        cam_handler.start()
+    elif not enable and state == RobotState.LIVE_CONTROL:
+        state = RobotState.IDLE
+        logger.info("Stopping live control.")
+        cam_handler.stop()
 
-    else:
-        logger.info(f'Received packet (ID: {packet.id} of type {packet.type})')
+
+def on_gps_cmd(packet: Packet):
+    global state
+    # Set state to autonomous control TODO use autonomous navigation script
+    logger.info("Received new GPS_coordinate.")
+    info = b'GPS coordinates received.'
+    if state != RobotState.AUTO_CONTROL:
+        state = RobotState.AUTO_CONTROL
+        logger.info("Starting autonomous navigation")
+        info += b' Starting autonomous navigation.'
+    info_packet = Packet(MsgType.INFO, data=info)
+    comm_handler.send_packet(info_packet)
+
+
+def on_other(packet: Packet):
+    logger.info(f'Received packet (ID: {packet.id} of type {packet.type})')
 
 
 # Failsafe to ensure motors are shutdown in case connection with landbase is suddenly dropped
@@ -204,7 +222,7 @@ def send_heartbeat():
     if my_ip is not None:
         hb_data += my_ip.encode('utf-8')
 
-    heartbeat = Packet(MsgType.HEARTBEAT, data=hb_data)
+    heartbeat = comm_handler.control_packet(MsgType.HEARTBEAT, data=hb_data)
     comm_handler.send_packet(heartbeat)
 
 
@@ -3,14 +3,15 @@ import struct
 import sys
 import requests
 
-
 # WebGUI_Utils.py
 #
-# Last updated: 04/26/2022
+# Last updated: 10/18/2026
 # Contains utility functions that are used by the Flask script. These functions create packets that can
 # be sent to the robot using the CommSys.
 #
 
+MOVE_ACK_TIMEOUT = 5  # Max time (in seconds) to wait for the robot to acknowledge a move command
+
 
 # Create packet for movement command
 
@@ -53,8 +54,14 @@ def sendMoveToCommand(latitude, longitude, commHandler):
 
     motor_command_packet = Packet(MsgType.GPS_CMD, 0, move_command, False)
 
-    commHandler.send_packet(motor_command_packet)
-    return f"Robot moving to ({round(latitude,4)}, {round(longitude,4)})"
+    future = commHandler.send_packet(motor_command_packet)
+    coordinates = f"({round(latitude,4)}, {round(longitude,4)})"
+    # Only report the robot as moving once it has acknowledged the command
+    if not future.wait(MOVE_ACK_TIMEOUT):
+        return f"Move command to {coordinates} sent, waiting for robot to acknowledge"
+    if not future.delivered():
+        return f"Failed to send move command to {coordinates}: {future.exception()}"
+    return f"Robot moving to {coordinates}"
 
 # Turn coordinates into strings
 